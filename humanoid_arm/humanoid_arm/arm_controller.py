@@ -0,0 +1,398 @@
+import moteus
+from dataclasses import dataclass, field
+import asyncio
+import gc
+from typing import Dict, List, Union
+from .trajectory_executor import TrajectoryExecutor
+from .topology import ArmTopology, make_transport, make_query_resolution
+from .scheduler import AdaptiveTimeout, DeadlineScheduler, Histogram, TrackingError
+from .command_template import MotorCommandTemplates
+from .recorder import Recorder
+import numpy as np
+import time
+
+
+@dataclass
+class MotorArrayDataClass:
+    """State of all arm motors as contiguous arrays, column i belongs to joint i."""
+    id: np.ndarray                                  # (n,) motor id
+    controller: List[moteus.Controller]             # (n,) controller, queries position, velocity and torque
+    slow_query: List[moteus.QueryResolution]        # (n,) query override that adds temperature, fault and absolute position
+    bus: np.ndarray                                 # (n,) index of the transport
+    reverse: np.ndarray                             # (n,) -1.0 if reversed else 1.0
+    offset: np.ndarray                              # (n,) joint zero in motor space (rad)
+    maximum_torque: np.ndarray                      # (n,) torque limit (Nm)
+    target: np.ndarray = None                       # (3, n) position, velocity and acceleration (joint space)
+    feedback: np.ndarray = None                     # (3, n) position, velocity and torque (joint space)
+    initialized: np.ndarray = None                  # (n,) motor answered a query, only these are commanded
+    temperature: np.ndarray = None                  # (n,) board temperature (C) of the last slow query
+    fault: np.ndarray = None                        # (n,) fault code of the last slow query
+    abs_position: np.ndarray = None                 # (n,) absolute encoder (revolution) of the last slow query
+    index: Dict[int, int] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        n = len(self.id)
+        self.target = np.zeros((3, n))
+        self.feedback = np.zeros((3, n))
+        self.initialized = np.zeros(n, dtype=bool)
+        self.temperature = np.full(n, np.nan)
+        self.fault = np.zeros(n, dtype=int)
+        self.abs_position = np.full(n, np.nan)
+        self.index = {int(motor_id): i for i, motor_id in enumerate(self.id)}
+
+    @classmethod
+    def from_topology(cls, topology: ArmTopology, transports: list = None) -> 'MotorArrayDataClass':
+        """Motor arrays of the topology, without controllers if no transports are given."""
+        bus = np.array([topology.bus_of(m) for m in topology.motors], dtype=int)
+        return cls(
+            id=np.array([m.id for m in topology.motors], dtype=int),
+            controller=[] if transports is None else [
+                moteus.Controller(id=m.id, transport=transports[b], query_resolution=make_query_resolution(m.query_resolution))
+                for m, b in zip(topology.motors, bus)
+            ],
+            slow_query=[make_query_resolution(m.query_resolution, slow=True) for m in topology.motors],
+            bus=bus,
+            reverse=np.array([-1.0 if m.reverse else 1.0 for m in topology.motors]),
+            offset=np.array([m.offset for m in topology.motors], dtype=float),
+            maximum_torque=np.array([m.maximum_torque for m in topology.motors], dtype=float)
+        )
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def joint_to_motor(self, position: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """Map joint position (rad) to motor position (revolution)."""
+        out = np.multiply(self.reverse, position, out=out)
+        out += self.offset
+        out /= 2 * np.pi
+        return out
+
+    def calibration_drift(self, offset: np.ndarray, abs_reference: np.ndarray) -> np.ndarray:
+        """Disagreement between calibrated offsets and the absolute encoders.
+
+        The joint position given by the offsets is compared with the one given by the absolute
+        encoders, assuming the joints are within half a revolution of their calibration pose.
+
+        Args:
+            offset (np.ndarray): (n,) calibrated joint zero in motor space (rad).
+            abs_reference (np.ndarray): (n,) absolute encoder (revolution) at calibration.
+
+        Returns:
+            np.ndarray: (n,) absolute difference (rad), NaN where the encoder was not read.
+        """
+        motor_position = self.reverse * self.feedback[0] + self.offset
+        abs_joint = (self.abs_position - abs_reference + 0.5) % 1.0 - 0.5
+        return np.abs(self.reverse * (motor_position - offset) - self.reverse * abs_joint * 2 * np.pi)
+
+    def update_feedback(self, index: np.ndarray, position: np.ndarray, velocity: np.ndarray, torque: np.ndarray) -> None:
+        """Map motor feedback (revolution, revolution/s, Nm) of the given joints to joint space."""
+        self.feedback[0, index] = self.reverse[index] * (position * 2 * np.pi - self.offset[index])
+        self.feedback[1, index] = self.reverse[index] * velocity * 2 * np.pi
+        self.feedback[2, index] = self.reverse[index] * torque
+
+
+@dataclass
+class BusHealth:
+    name: str
+    timeout: float                                  # cycle timeout (s)
+    rate: float                                     # control rate (Hz)
+    healthy: bool = True
+    consecutive_timeouts: int = 0
+    timeouts: int = 0
+    overruns: int = 0
+    cycles: int = 0
+    last_feedback: float = 0.0                      # time.monotonic() of the last answered cycle
+    latency: Histogram = field(default_factory=Histogram)   # command round trip
+    jitter: Histogram = field(default_factory=Histogram)    # wake up after the deadline
+    tracking: TrackingError = None                  # commanded position minus feedback, indexed by joint
+
+
+@dataclass
+class ControllerOptions:
+    control_rate: float = 200.0                     # Hz, for buses without their own rate
+    feedback_decimation: int = 1                    # on_feedback every n cycles of the first healthy bus
+    bus_max_timeouts: int = 10                      # consecutive timeouts until a bus is unhealthy
+    bus_retry_period: float = 0.5                   # retry period of an unhealthy bus (s)
+    slow_query_decimation: int = 100                # temperature and fault every n cycles, 0 to never query them
+    discovery_timeout: float = 0.05                 # probe timeout before the round trip is known (s)
+    discovery_retry_period: float = 1.0             # period of probing a missing motor (s)
+    simulated: bool = False                         # replace every adapter by the simulated transport
+    simulation: dict = field(default_factory=dict)  # keyword arguments of SimulatedTransport
+    gc_freeze: bool = False                         # freeze the objects alive when the loops start
+    gc_threshold: int = 0                           # generation 0 threshold, 0 to keep the default
+    # Feedforward of the planned state, scalar or one value per joint
+    velocity_feedforward_gain: Union[float, List[float]] = 1.0     # planned velocity sent with the position
+    torque_feedforward_gain: Union[float, List[float]] = 0.0       # inertia * planned acceleration sent as torque, 0 disables
+    joint_inertia: Union[float, List[float]] = 0.0                 # kg*m^2
+
+
+class ArmController:
+    def __init__(self, topology: ArmTopology, options: ControllerOptions, logger, ok, on_feedback=None) -> None:
+        """Bus loops of the arm, free of ROS so they run in the node's thread or in a real-time process.
+
+        Args:
+            topology (ArmTopology): buses and motors.
+            options (ControllerOptions): loop options.
+            logger: object with info, warning and error, accepting throttle_duration_sec.
+            ok: callable, the loops run while it returns True.
+            on_feedback (optional): callable, called when new feedback should be published.
+        """
+        self.topology = topology
+        self.options = options
+        self._logger = logger
+        self._ok = ok
+        self._on_feedback = on_feedback
+        self._flags = np.ones(1, dtype=bool)
+        # Trajectories are sampled by the control loop, a new command preempts the active one
+        self.trajectory_executor = TrajectoryExecutor()
+        # Demonstration being recorded, one sample per cycle of the first healthy bus
+        self.recorder = None
+
+    @property
+    def teach_mode(self) -> bool:
+        return bool(self._flags[0])
+
+    @teach_mode.setter
+    def teach_mode(self, value: bool) -> None:
+        self._flags[0] = value
+
+    def start_recording(self, capacity: int) -> None:
+        self.recorder = Recorder(len(self.motors), capacity)
+
+    def stop_recording(self):
+        """Stop recording, returns timestamps (k,) and feedback (k, 3, n), None if nothing was recorded."""
+        if (recorder := self.recorder) is None:
+            return None
+        self.recorder = None
+        if recorder.dropped:
+            self._logger.warning(f'Recording full, {recorder.dropped} samples dropped.')
+        return recorder.take()
+
+    def initialize(self) -> None:
+        topology = self.topology
+        options = self.options
+
+        # Create transport, the simulated transport replaces every adapter for tests without hardware
+        if options.simulated:
+            for b in topology.buses:
+                b.transport = 'simulated'
+        self.transports = [
+            make_transport(b, ids=[m.id for m in topology.motors_on(i)], **options.simulation)
+            for i, b in enumerate(topology.buses)
+        ]
+
+        # create motors
+        self.motors = MotorArrayDataClass.from_topology(topology, self.transports)
+        # Feedforward gains from joint space to motor space (revolution/s and Nm)
+        n = len(self.motors)
+        self._velocity_feedforward = self.motors.reverse * np.broadcast_to(np.asarray(options.velocity_feedforward_gain, dtype=float), (n,)) / (2 * np.pi)
+        self._torque_feedforward = self.motors.reverse * np.broadcast_to(np.asarray(options.torque_feedforward_gain, dtype=float), (n,)) \
+            * np.broadcast_to(np.asarray(options.joint_inertia, dtype=float), (n,))
+        self._feedforward_torque = bool(np.any(self._torque_feedforward))
+
+        # Commands are built once and patched every cycle, the torque field is only sent if used
+        self._commands = [
+            MotorCommandTemplates(c, q, t, self._feedforward_torque)
+            for c, q, t in zip(self.motors.controller, self.motors.slow_query, self.motors.maximum_torque.tolist())
+        ]
+        self._motor_position = np.zeros(n)
+        self._motor_velocity = np.zeros(n)
+        self._motor_torque = np.zeros(n)
+
+        # joint indices and health of every transport
+        self.bus_index = [np.flatnonzero(self.motors.bus == b) for b in range(len(self.transports))]
+        self.bus_health = [
+            BusHealth(name=b.name, timeout=b.timeout, rate=b.rate or options.control_rate, tracking=TrackingError(n))
+            for b in topology.buses
+        ]
+        # Motor probes wait a few measured round trips
+        self._bus_probe_timeout = [AdaptiveTimeout(options.discovery_timeout, 0.005, 0.5) for _ in topology.buses]
+        self._logger.info(f'Arm topology: {len(self.motors)} motors on {len(self.transports)} buses.')
+
+    async def _bus_cycle(self, b: int, index: np.ndarray, make_command) -> list:
+        """Send one command to the given motors of bus b, make_command maps a joint index to a moteus command."""
+        return await asyncio.wait_for(
+            self.transports[b].cycle([make_command(i) for i in index]),
+            self.bus_health[b].timeout
+        )
+
+    async def _probe(self, b: int, index) -> list:
+        """Query the given motors of bus b with the slow query, returns the states of the motors that answered."""
+        timeout = self._bus_probe_timeout[b]
+        st = time.monotonic()
+        try:
+            states = await asyncio.wait_for(
+                self.transports[b].cycle([self.motors.controller[i].make_stop(query=True, query_override=self.motors.slow_query[i]) for i in index]),
+                timeout.timeout * len(index)
+            )
+        except (asyncio.exceptions.TimeoutError, ValueError):
+            if len(index) <= 1:
+                return []
+            # Someone did not answer, probe one by one so the others are still found
+            states = []
+            for i in index:
+                states += await self._probe(b, [i])
+            return states
+        timeout.update((time.monotonic() - st) / len(index))
+        return states
+
+    async def discover_motors(self) -> None:
+        """Probe every bus concurrently and report which motors are online in one pass."""
+        for states in await asyncio.gather(*[self._probe(b, index) for b, index in enumerate(self.bus_index)]):
+            self._update_motor_states(states)
+        online = self.motors.id[self.motors.initialized].tolist()
+        offline = self.motors.id[~self.motors.initialized].tolist()
+        if offline:
+            self._logger.error(f'Motor {offline} not found, online: {online}.')
+        else:
+            self._logger.info(f'All motors online: {online}.')
+
+    def _update_motor_states(self, states: list) -> None:
+        if not states:
+            return
+
+        # mapping motor state to joint space
+        index = np.array([self.motors.index[s.id] for s in states], dtype=int)
+        self.motors.initialized[index] = True
+        self.motors.update_feedback(
+            index,
+            np.array([s.values[moteus.Register.POSITION] for s in states]),
+            np.array([s.values[moteus.Register.VELOCITY] for s in states]),
+            np.array([s.values[moteus.Register.TORQUE] for s in states])
+        )
+
+        # slow query
+        for i, s in zip(index, states):
+            if moteus.Register.FAULT in s.values:
+                self.motors.temperature[i] = s.values[moteus.Register.TEMPERATURE]
+                if s.values[moteus.Register.FAULT] and not self.motors.fault[i]:
+                    self._logger.error(f'Motor {self.motors.id[i]} fault {s.values[moteus.Register.FAULT]}.')
+                self.motors.fault[i] = s.values[moteus.Register.FAULT]
+            if moteus.Register.ABS_POSITION in s.values:
+                self.motors.abs_position[i] = s.values[moteus.Register.ABS_POSITION]
+
+    def _bus_timeout(self, b: int) -> None:
+        health = self.bus_health[b]
+        health.timeouts += 1
+        health.consecutive_timeouts += 1
+        if health.healthy and health.consecutive_timeouts >= self.options.bus_max_timeouts:
+            health.healthy = False
+            self._logger.error(f'Bus {health.name} timeout {health.consecutive_timeouts} times, marked unhealthy.')
+        else:
+            self._logger.warning(f'Bus {health.name} send command timeout {health.consecutive_timeouts}.')
+
+    def _bus_feedback(self, b: int, states: list) -> None:
+        health = self.bus_health[b]
+        if not health.healthy:
+            self._logger.info(f'Bus {health.name} recovered after {health.consecutive_timeouts} timeouts.')
+        health.healthy = True
+        health.consecutive_timeouts = 0
+        health.cycles += 1
+        health.last_feedback = time.monotonic()
+        self._update_motor_states(states)
+
+        # record and publish feedback, counted in cycles of the first healthy bus
+        if b == next(i for i, h in enumerate(self.bus_health) if h.healthy):
+            if (recorder := self.recorder) is not None:
+                recorder.add(health.last_feedback, self.motors.feedback)
+            if self._on_feedback is not None and health.cycles % self.options.feedback_decimation == 0:
+                self._on_feedback()
+
+    async def _probe_loop(self, b: int) -> None:
+        """Probe one missing motor of bus b per retry period, next to its control loop so a dead motor never stalls a cycle."""
+        probe_counter = 0
+        while True:
+            await asyncio.sleep(self.options.discovery_retry_period)
+            missing = self.bus_index[b][~self.motors.initialized[self.bus_index[b]]]
+            if not len(missing) or not self.bus_health[b].healthy:
+                continue
+            i = missing[probe_counter % len(missing)]
+            probe_counter += 1
+            if states := await self._probe(b, [i]):
+                self._update_motor_states(states)
+                # Hold the position it was found at until the next command
+                self.motors.target[0, i] = self.motors.feedback[0, i]
+                self.motors.target[1:, i] = 0.0
+                self._logger.info(f'Motor {self.motors.id[i]} online.')
+
+    async def _bus_loop(self, b: int) -> None:
+        """Control loop of one bus, a slow or dead bus does not hold back the others."""
+        health = self.bus_health[b]
+
+        # control loop
+        scheduler = DeadlineScheduler(health.rate)
+        while self._ok():
+            index = self.bus_index[b][self.motors.initialized[self.bus_index[b]]]
+
+            health.jitter.add(await scheduler.wait())
+            if scheduler.overruns > health.overruns:
+                health.overruns = scheduler.overruns
+                self._logger.warning(f'Bus {health.name} cycle overran {1000 * scheduler.period:.1f} ms, {health.overruns} overruns.', throttle_duration_sec=1.0)
+
+            # Ask for temperature and fault once in a while only, they cost frame size every cycle
+            slow = int(self.options.slow_query_decimation > 0 and health.cycles % self.options.slow_query_decimation == 0)
+
+            # Sample the active trajectory at the timestamp of this cycle
+            st = time.monotonic()
+            self.trajectory_executor.sample(st, self.motors.target)
+
+            commanded = None
+            try:
+                # Send command
+                if self.teach_mode:
+                    states = await self._bus_cycle(b, index, lambda i: self._commands[i].stop[slow])
+                elif np.any(~np.isfinite(self.motors.target[:, index]).all(axis=0) | (np.abs(self.motors.target[0, index]) > 6.28)):
+                    # Check joint limit, keep the last command and only query
+                    self._logger.error('Some target of arm motors is not finite or greater than 6.28, ignored.', throttle_duration_sec=1.0)
+                    states = await self._bus_cycle(b, index, lambda i: self._commands[i].query[slow])
+                else:
+                    position = self.motors.joint_to_motor(self.motors.target[0], out=self._motor_position).tolist()
+                    velocity = np.multiply(self._velocity_feedforward, self.motors.target[1], out=self._motor_velocity).tolist()
+                    commanded = self.motors.target[0, index]
+                    if self._feedforward_torque:
+                        torque = np.multiply(self._torque_feedforward, self.motors.target[2], out=self._motor_torque).tolist()
+                        states = await self._bus_cycle(b, index, lambda i: self._commands[i].position[slow].set(position[i], velocity[i], torque[i]))
+                    else:
+                        states = await self._bus_cycle(b, index, lambda i: self._commands[i].position[slow].set(position[i], velocity[i]))
+            except asyncio.exceptions.TimeoutError:
+                self._bus_timeout(b)
+                if not health.healthy:
+                    # Back off while the bus is down
+                    await asyncio.sleep(self.options.bus_retry_period)
+                    scheduler.reset()
+            else:
+                health.latency.add(time.monotonic() - st)
+                self._bus_feedback(b, states)
+                if commanded is not None:
+                    health.tracking.add(index, commanded - self.motors.feedback[0, index])
+
+        # Stop motors
+        index = self.bus_index[b][self.motors.initialized[self.bus_index[b]]]
+        try:
+            await self._bus_cycle(b, index, lambda i: self.motors.controller[i].make_stop())
+        except asyncio.exceptions.TimeoutError:
+            self._logger.error(f'Bus {health.name} failed to stop motors.')
+
+    async def run(self, *tasks) -> None:
+        """Find the online motors and run the bus loops until ok() returns False.
+
+        Args:
+            tasks: other coroutines to run next to the bus loops.
+        """
+        # Find online motors, missing ones are probed again while the bus loops run
+        await self.discover_motors()
+
+        # Objects alive now are never collected, so the collector only walks what the loop allocates
+        if self.options.gc_freeze:
+            gc.collect()
+            gc.freeze()
+        if self.options.gc_threshold > 0:
+            gc.set_threshold(self.options.gc_threshold, *gc.get_threshold()[1:])
+
+        # every bus runs its own cycle task, missing motors are probed by a task of their own
+        probes = [asyncio.ensure_future(self._probe_loop(b)) for b in range(len(self.transports))]
+        try:
+            await asyncio.gather(*[self._bus_loop(b) for b in range(len(self.transports))], *tasks)
+        finally:
+            for probe in probes:
+                probe.cancel()
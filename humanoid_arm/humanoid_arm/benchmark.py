@@ -0,0 +1,125 @@
+import rclpy
+from rclpy.executors import MultiThreadedExecutor
+from std_srvs.srv import SetBool
+import argparse
+import threading
+import time
+import numpy as np
+from humanoid_arm.humanoid_arm_node import HumanoidArmNode
+
+
+def wait_ready(node: HumanoidArmNode, timeout: float) -> bool:
+    """Wait until the node is initialized and all motors answered."""
+    st = time.monotonic()
+    while time.monotonic() - st < timeout:
+        if hasattr(node, '_bus_health') and hasattr(node, '_diagnostics_timer') and np.all(node._motors.initialized):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def set_teach_mode(node: HumanoidArmNode, enable: bool) -> None:
+    node._teach_mode_callback(SetBool.Request(data=enable), SetBool.Response())
+
+
+def measure(node: HumanoidArmNode, name: str, run) -> None:
+    """Run a scenario, sample the tracking error every 5 ms and report rate, overruns and error."""
+    cycles = [h.cycles for h in node._bus_health]
+    overruns = [h.overruns for h in node._bus_health]
+    timeouts = [h.timeouts for h in node._bus_health]
+    errors = []
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            errors.append(np.max(np.abs(node._motors.target[0] - node._motors.feedback[0])))
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample)
+    st = time.monotonic()
+    sampler.start()
+    run()
+    done.set()
+    sampler.join()
+    elapsed = time.monotonic() - st
+
+    print(f'[{name}] {elapsed:.2f} s')
+    for i, h in enumerate(node._bus_health):
+        print(
+            f'  bus {h.name}: {(h.cycles - cycles[i]) / elapsed:.1f} Hz (target {h.rate:.0f} Hz), '
+            f'overruns: {h.overruns - overruns[i]}, timeouts: {h.timeouts - timeouts[i]}'
+        )
+    if errors:
+        p50, p95, p99 = np.percentile(errors, [50, 95, 99])
+        print(f'  tracking error (rad): p50 {p50:.4f}, p95 {p95:.4f}, p99 {p99:.4f}, max {np.max(errors):.4f}')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the arm control loop, on the simulated transport by default.')
+    parser.add_argument('--hardware', action='store_true', help='use the configured fdcanusb adapters')
+    parser.add_argument('--rate', type=float, default=200.0, help='control rate (Hz)')
+    parser.add_argument('--latency', type=float, default=0.001, help='simulated round trip (s)')
+    parser.add_argument('--jitter', type=float, default=0.0002, help='simulated round trip standard deviation (s)')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='simulated reply loss probability')
+    parser.add_argument('--duration', type=float, default=5.0, help='duration of the teach scenario (s)')
+    parser.add_argument('--frames', nargs='+', default=['home', 'hello1', 'hello2', 'home'], help='frames to play')
+    parser.add_argument('--frame-duration', type=float, default=1.0, help='duration of every play (s)')
+    parser.add_argument('--velocity-feedforward', type=float, default=1.0, help='velocity feedforward gain, 0 to disable')
+    parser.add_argument('--torque-feedforward', type=float, default=0.0, help='torque feedforward gain')
+    parser.add_argument('--inertia', type=float, default=0.0, help='joint inertia of the torque feedforward (kg*m^2)')
+    parsed = parser.parse_args(args)
+
+    ros_args = [
+        '--ros-args',
+        '-p', f'control_rate:={parsed.rate}',
+        '-p', f'velocity_feedforward_gain:={parsed.velocity_feedforward}',
+        '-p', f'torque_feedforward_gain:={parsed.torque_feedforward}',
+        '-p', f'joint_inertia:={parsed.inertia}',
+    ]
+    if not parsed.hardware:
+        ros_args += [
+            '-p', 'simulated_transport:=true',
+            '-p', f'simulated_latency:={parsed.latency}',
+            '-p', f'simulated_jitter:={parsed.jitter}',
+            '-p', f'simulated_drop_rate:={parsed.drop_rate}',
+        ]
+    rclpy.init(args=ros_args)
+    node = HumanoidArmNode()
+    executor = MultiThreadedExecutor()
+    executor.add_node(node)
+    spin_thread = threading.Thread(target=executor.spin, daemon=True)
+    spin_thread.start()
+
+    try:
+        if not wait_ready(node, 10.0):
+            print('Arm motors not ready.')
+            return
+
+        def teach():
+            set_teach_mode(node, True)
+            time.sleep(parsed.duration)
+
+        def play():
+            set_teach_mode(node, False)
+            for frame_name in parsed.frames:
+                st = time.monotonic()
+                node._trajectory_executor.submit(node._plan_to_frame(frame_name, parsed.frame_duration, st), st).wait()
+
+        def sequence():
+            set_teach_mode(node, False)
+            for time_optimal in (False, True):
+                st = time.monotonic()
+                traj = node._plan_sequence(parsed.frames, [parsed.frame_duration] * len(parsed.frames), time_optimal, st)
+                node._trajectory_executor.submit(traj, st).wait()
+
+        measure(node, 'teach', teach)
+        measure(node, 'play', play)
+        measure(node, 'sequence', sequence)
+        set_teach_mode(node, True)
+    finally:
+        rclpy.shutdown()
+        node._control_thread.join()
+
+
+if __name__ == '__main__':
+    main()
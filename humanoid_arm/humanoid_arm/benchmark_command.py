@@ -0,0 +1,76 @@
+import moteus
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import numpy as np
+from humanoid_arm.topology import make_query_resolution
+from humanoid_arm.command_template import MotorCommandTemplates
+
+
+def build_commands(controllers, reverse, offset, maximum_torque, target):
+    """Per cycle work of the control loop before command templates."""
+    position = ((reverse * target[0] + offset) / (2 * np.pi)).tolist()
+    velocity = (reverse * target[1] / (2 * np.pi)).tolist()
+    return [
+        c.make_position(position=position[i], velocity=velocity[i], maximum_torque=maximum_torque[i], query=True)
+        for i, c in enumerate(controllers)
+    ]
+
+
+def patch_commands(templates, reverse, offset, buffer, target):
+    """Per cycle work of the control loop with command templates."""
+    out = np.multiply(reverse, target[0], out=buffer[0])
+    out += offset
+    out /= 2 * np.pi
+    position = out.tolist()
+    out = np.multiply(reverse, target[1], out=buffer[1])
+    out /= 2 * np.pi
+    velocity = out.tolist()
+    return [t.position[0].set(position[i], velocity[i]) for i, t in enumerate(templates)]
+
+
+def measure(name: str, run, cycles: int) -> None:
+    run()
+    collections = sum(s['collections'] for s in gc.get_stats())
+    st = time.perf_counter()
+    for _ in range(cycles):
+        run()
+    elapsed = time.perf_counter() - st
+    collections = sum(s['collections'] for s in gc.get_stats()) - collections
+
+    # Peak of the memory allocated while building one cycle
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{name:>10}: {1e6 * elapsed / cycles:8.2f} us/cycle, {peak:6d} B allocated/cycle, {collections} gc collections in {cycles} cycles')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Python overhead of building the arm position commands of one cycle.')
+    parser.add_argument('--motors', type=int, default=10, help='number of motors')
+    parser.add_argument('--cycles', type=int, default=20000, help='measured cycles')
+    parser.add_argument('--gc-freeze', action='store_true', help='freeze the objects alive before measuring')
+    parsed = parser.parse_args(args)
+
+    n = parsed.motors
+    controllers = [moteus.Controller(id=i + 1, query_resolution=make_query_resolution('int16')) for i in range(n)]
+    slow_query = make_query_resolution('int16', slow=True)
+    templates = [MotorCommandTemplates(c, slow_query, 8.0) for c in controllers]
+    reverse = np.ones(n)
+    offset = np.zeros(n)
+    maximum_torque = [8.0] * n
+    buffer = np.zeros((2, n))
+    target = np.vstack([np.linspace(-1.0, 1.0, n), np.linspace(-0.5, 0.5, n)])
+    if parsed.gc_freeze:
+        gc.collect()
+        gc.freeze()
+
+    measure('build', lambda: build_commands(controllers, reverse, offset, maximum_torque, target), parsed.cycles)
+    measure('template', lambda: patch_commands(templates, reverse, offset, buffer, target), parsed.cycles)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
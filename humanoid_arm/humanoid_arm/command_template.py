@@ -0,0 +1,67 @@
+import struct
+import moteus
+
+
+class PositionCommandTemplate:
+    def __init__(self, controller: moteus.Controller, query_override: moteus.QueryResolution = None,
+                 fields=('position',), **kwargs) -> None:
+        """make_position command built once, only the payload of the given fields is rewritten every cycle.
+
+        Args:
+            controller (moteus.Controller): controller with F32 resolution of the fields.
+            query_override (moteus.QueryResolution, optional): query of the command.
+            fields (tuple, optional): make_position arguments rewritten by set(), in register order.
+            kwargs: other make_position arguments, fixed for the lifetime of the template.
+        """
+        def make(**values):
+            return controller.make_position(query=True, query_override=query_override, **kwargs, **values)
+
+        base = dict.fromkeys(fields, 0.0)
+        self.command = make(**{**base, fields[0]: 1.0})
+        self._offset = self._find_payload(self.command.data, make(**{**base, fields[0]: -1.0}).data)
+        # Fields are consecutive registers, so one pack writes all of them
+        for i, name in enumerate(fields[1:], 1):
+            if self._find_payload(make(**{**base, name: 1.0}).data, make(**{**base, name: -1.0}).data) != self._offset + 4 * i:
+                raise ValueError(f'Command fields {fields} are not consecutive F32 registers.')
+        self._struct = struct.Struct('<' + 'f' * len(fields))
+        self.command.data = bytearray(self.command.data)
+
+        # The template must encode exactly like moteus does
+        check = [0.123 * (i + 1) for i in range(len(fields))]
+        if bytes(self.set(*check).data) != make(**dict(zip(fields, check))).data:
+            raise ValueError('Position command layout not supported, the resolution of the fields must be F32.')
+
+    @staticmethod
+    def _find_payload(a: bytes, b: bytes) -> int:
+        # +1.0 and -1.0 differ in the sign byte, the last byte of the little endian f32
+        diff = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+        if len(a) != len(b) or not diff or diff[-1] - diff[0] > 3:
+            raise ValueError('Position payload not found in the command.')
+        return diff[-1] - 3
+
+    def set(self, *values: float) -> moteus.Command:
+        """Patch the fields in place and return the command."""
+        self._struct.pack_into(self.command.data, self._offset, *values)
+        return self.command
+
+
+class MotorCommandTemplates:
+    def __init__(self, controller: moteus.Controller, slow_query: moteus.QueryResolution, maximum_torque: float,
+                 feedforward_torque: bool = False) -> None:
+        """Every command the control loop sends to one motor, index 1 also queries temperature and fault.
+
+        Position commands take position and velocity, and the feedforward torque if enabled.
+        """
+        self.stop = (
+            controller.make_stop(query=True),
+            controller.make_stop(query=True, query_override=slow_query)
+        )
+        self.query = (
+            controller.make_query(),
+            controller.make_query(query_override=slow_query)
+        )
+        fields = ('position', 'velocity', 'feedforward_torque') if feedforward_torque else ('position', 'velocity')
+        self.position = (
+            PositionCommandTemplate(controller, fields=fields, maximum_torque=maximum_torque),
+            PositionCommandTemplate(controller, query_override=slow_query, fields=fields, maximum_torque=maximum_torque)
+        )
@@ -1,29 +1,190 @@
 import moteus
 import asyncio
-from itertools import chain
+import argparse
+import csv
+import signal
+import sys
+from humanoid_arm.topology import load_topology, make_transport
+from humanoid_arm.scheduler import DeadlineScheduler, Histogram
+import numpy as np
 import time
 
 
-async def cycle(controls):
-    for c in controls:
-        try:
-            await asyncio.wait_for(c.set_stop(query=True), 0.2)
-        except asyncio.exceptions.TimeoutError:
-            print(f'Send command timeout, id: {c.id}.')
+# One record per bus round trip, bus CYCLE_BUS marks the time of the whole cycle over all buses
+LOG_DTYPE = np.dtype([
+    ('cycle', '<u4'),
+    ('bus', 'u1'),
+    ('replies', 'u1'),
+    ('timeout', 'u1'),
+    ('start', '<f8'),                               # time.monotonic() (s)
+    ('round_trip', '<f4'),                          # (s)
+])
+CYCLE_BUS = 255
+
+
+async def bus_cycle(b: int, transport, controls, make_command, timeout: float, records: list, cycle: int) -> list:
+    st = time.monotonic()
+    try:
+        states = await asyncio.wait_for(transport.cycle([make_command(c) for c in controls]), timeout)
+    except asyncio.exceptions.TimeoutError:
+        states = None
+    records.append((cycle, b, 0 if states is None else len(states), states is None, st, time.monotonic() - st))
+    return states
+
+
+def summarize(records: np.ndarray, names: list) -> list:
+    """p50/p95/p99/max round trip (ms) of every bus and of the whole cycle."""
+    rows = []
+    for b in sorted(set(records['bus'].tolist())):
+        r = records[records['bus'] == b]
+        rtt = r['round_trip'][r['timeout'] == 0] * 1000
+        p50, p95, p99 = np.percentile(rtt, [50, 95, 99]) if len(rtt) else (np.nan,) * 3
+        rows.append({
+            'bus': 'cycle' if b == CYCLE_BUS else names[b] if b < len(names) else str(b),
+            'count': len(r),
+            'timeouts': int(r['timeout'].sum()),
+            'mean_ms': float(rtt.mean()) if len(rtt) else np.nan,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'max_ms': float(rtt.max()) if len(rtt) else np.nan,
+        })
+    return rows
+
+
+def print_report(records: np.ndarray, names: list) -> None:
+    rows = summarize(records, names)
+    for row in rows:
+        print(
+            f"{row['bus']:>8}: {row['count']} cycles, {row['timeouts']} timeouts, "
+            f"p50 {row['p50_ms']:.3f} ms, p95 {row['p95_ms']:.3f} ms, p99 {row['p99_ms']:.3f} ms, max {row['max_ms']:.3f} ms"
+        )
+    for b in sorted(set(records['bus'].tolist())):
+        histogram = Histogram()
+        for rtt in records['round_trip'][(records['bus'] == b) & (records['timeout'] == 0)]:
+            histogram.add(float(rtt))
+        counts, _ = histogram.take()
+        print(f"{'cycle' if b == CYCLE_BUS else names[b] if b < len(names) else b}:")
+        for label, c in zip(Histogram.labels(), counts):
+            print(f'  {label:>9} {c:8d} {"#" * int(60 * c / max(counts.max(), 1))}')
+
 
+def write_csv(records: np.ndarray, names: list, path: str) -> None:
+    rows = summarize(records, names)
+    fp = sys.stdout if path == '-' else open(path, 'w', newline='')
+    writer = csv.DictWriter(fp, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+    if fp is not sys.stdout:
+        fp.close()
 
-async def main(args=None):
-    transport_left = moteus.Fdcanusb('/dev/serial/by-id/usb-mjbots_fdcanusb_826543DB-if00')
-    transport_right = moteus.Fdcanusb('/dev/serial/by-id/usb-mjbots_fdcanusb_1EB12734-if00')
-    control_left = [moteus.Controller(id=i, transport=transport_left) for i in range(14, 19)]
-    control_right = [moteus.Controller(id=i, transport=transport_right) for i in range(19, 24)]
-    while True:
-        st = time.time()
-        await asyncio.gather(cycle(control_left), cycle(control_right))
-        dt = 1000 * (time.time() - st)
-        if dt > 20:
-            print(f'Cycle time: {dt} ms > 20 ms.')
+
+async def run(parsed) -> np.ndarray:
+    topology = load_topology(parsed.config)
+    buses = [b for b in topology.buses if not parsed.buses or b.name in parsed.buses]
+    if parsed.simulated:
+        for b in buses:
+            b.transport = 'simulated'
+    transports = []
+    controls = []
+    for bus in buses:
+        motors = [m for m in topology.motors if m.bus == bus.name and (not parsed.motors or m.id in parsed.motors)]
+        transport = make_transport(bus, ids=[m.id for m in motors])
+        transports.append(transport)
+        controls.append([(moteus.Controller(id=m.id, transport=transport), m) for m in motors])
+
+    # Hold the current position when sending position commands, motors that do not answer are left out
+    hold = {}
+    if parsed.command == 'position':
+        for bus, control in zip(buses, controls):
+            for c, m in list(control):
+                try:
+                    state = await asyncio.wait_for(c.set_stop(query=True), 1.0)
+                except asyncio.exceptions.TimeoutError:
+                    state = None
+                if state is None:
+                    print(f'Motor {m.id} on bus {bus.name} missing, left out.')
+                    control.remove((c, m))
+                else:
+                    hold[m.id] = state.values[moteus.Register.POSITION]
+
+    make_command = {
+        'stop': lambda c: c[0].make_stop(query=True),
+        'query': lambda c: c[0].make_query(),
+        'position': lambda c: c[0].make_position(position=hold[c[1].id], velocity=0.0, maximum_torque=c[1].maximum_torque, query=True),
+    }[parsed.command]
+
+    records = []
+    log = open(parsed.log, 'wb') if parsed.log else None
+    scheduler = DeadlineScheduler(parsed.rate) if parsed.rate > 0 else None
+    cycle = 0
+    st = time.monotonic()
+    # Ctrl-C ends the measurement after the current cycle, the report is still printed
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    try:
+        while not stop.is_set() and (parsed.cycles == 0 or cycle < parsed.cycles) and (parsed.duration == 0 or time.monotonic() - st < parsed.duration):
+            if scheduler is not None:
+                await scheduler.wait()
+            cycle_start = time.monotonic()
+            await asyncio.gather(*[
+                bus_cycle(b, transport, control, make_command, parsed.timeout, records, cycle)
+                for b, (transport, control) in enumerate(zip(transports, controls))
+            ])
+            dt = time.monotonic() - cycle_start
+            records.append((cycle, CYCLE_BUS, 0, 0, cycle_start, dt))
+            if dt > parsed.threshold:
+                print(f'Cycle {cycle} time: {1000 * dt:.3f} ms > {1000 * parsed.threshold:.1f} ms.')
+            cycle += 1
+            # Flush the log in chunks to keep writes out of the timing
+            if log is not None and len(records) >= 4096:
+                np.array(records, dtype=LOG_DTYPE).tofile(log)
+                records.clear()
+    finally:
+        loop.remove_signal_handler(signal.SIGINT)
+        for transport, control in zip(transports, controls):
+            await transport.cycle([c.make_stop() for c, _ in control])
+        if log is not None:
+            np.array(records, dtype=LOG_DTYPE).tofile(log)
+            log.close()
+    if log is not None:
+        return np.fromfile(parsed.log, dtype=LOG_DTYPE), [b.name for b in buses]
+    return np.array(records, dtype=LOG_DTYPE), [b.name for b in buses]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Measure the CAN round trip of the arm buses.')
+    parser.add_argument('--config', default=None, help='arm topology yaml, the installed arm_mapping.yaml by default')
+    parser.add_argument('--buses', nargs='*', default=None, help='bus names to use, all by default')
+    parser.add_argument('--motors', nargs='*', type=int, default=None, help='motor ids to use, all by default')
+    parser.add_argument('--command', choices=['stop', 'position', 'query'], default='stop', help='command sent every cycle')
+    parser.add_argument('--rate', type=float, default=0.0, help='cycle rate (Hz), 0 to run as fast as possible')
+    parser.add_argument('--cycles', type=int, default=0, help='stop after n cycles')
+    parser.add_argument('--duration', type=float, default=0.0, help='stop after n seconds')
+    parser.add_argument('--timeout', type=float, default=0.2, help='bus round trip timeout (s)')
+    parser.add_argument('--threshold', type=float, default=0.02, help='print cycles slower than this (s)')
+    parser.add_argument('--simulated', action='store_true', help='use the simulated transport')
+    parser.add_argument('--log', default=None, help='binary log of every round trip')
+    parser.add_argument('--read', default=None, help='report on a binary log instead of measuring')
+    parser.add_argument('--csv', default=None, help='write the summary as CSV, - for stdout')
+    parsed = parser.parse_args(args)
+
+    if parsed.read:
+        records, names = np.fromfile(parsed.read, dtype=LOG_DTYPE), []
+        try:
+            names = [b.name for b in load_topology(parsed.config).buses if not parsed.buses or b.name in parsed.buses]
+        except (OSError, KeyError):
+            pass
+    else:
+        records, names = asyncio.run(run(parsed))
+    if len(records) == 0:
+        print('No cycle recorded.')
+        return
+    print_report(records, names)
+    if parsed.csv:
+        write_csv(records, names, parsed.csv)
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    main(sys.argv[1:])
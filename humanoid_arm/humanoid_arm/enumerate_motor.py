@@ -1,32 +1,120 @@
 import asyncio
 import moteus
+import argparse
+import glob
+import json
+import sys
+import time
+from humanoid_arm.scheduler import AdaptiveTimeout
+from humanoid_arm.topology import load_topology
 
 
-async def detect_motor(motor_id):
-    c = moteus.Controller(motor_id)
-    s = moteus.Stream(c)
+# Config registers read from every motor found
+DEFAULT_REGISTERS = [
+    'id.id',
+    'can.prefix',
+    'servopos.position_min',
+    'servopos.position_max',
+    'servo.max_current_A',
+    'servo.default_velocity_limit',
+    'motor_position.rotor_to_output_ratio',
+]
 
-    try:
-        response = await asyncio.wait_for(s.command(b'conf get id.id', allow_any_response=True), 0.1)
-    except asyncio.exceptions.TimeoutError:
-        return None
-    return response.decode('utf8')
 
+async def probe(transport, ids, timeout: AdaptiveTimeout) -> list:
+    """Query every id, returns the ids that answered before one shared deadline.
 
-async def enumerate_motor(max_id):
-    result = []
-    for i in range(1, max_id):
-        r = await detect_motor(i)
-        if r is not None:
-            result.append(i)
-            print(f'motor {i} response {r}')
-    return result
+    The queries are all written before any reply is awaited, an absent id simply never
+    answers instead of stalling a cycle. The deadline is one timeout after the last write.
+    """
+    sent = {}
+    for i in ids:
+        await transport.write(moteus.Controller(id=i, transport=transport).make_query())
+        sent[i] = time.monotonic()
+    found = set()
+    deadline = time.monotonic() + timeout.timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        try:
+            frame = await asyncio.wait_for(transport.read(), remaining)
+        except asyncio.exceptions.TimeoutError:
+            break
+        motor_id = (frame.arbitration_id >> 8) & 0x7f
+        if motor_id in sent and motor_id not in found:
+            found.add(motor_id)
+            timeout.update(time.monotonic() - sent[motor_id])
+    return sorted(found)
 
 
-async def main():
-    motor_id = await enumerate_motor(30)
-    print(motor_id)
+async def read_config(transport, motor_id: int, registers, timeout: float) -> dict:
+    s = moteus.Stream(moteus.Controller(id=motor_id, transport=transport))
+    config = {}
+    for r in registers:
+        try:
+            response = await asyncio.wait_for(s.command(f'conf get {r}'.encode('utf8'), allow_any_response=True), timeout)
+        except (asyncio.exceptions.TimeoutError, ValueError):
+            config[r] = None
+        else:
+            config[r] = response.decode('utf8').strip()
+    return config
+
+
+async def scan_device(device: str, ids, registers, timeout: float) -> dict:
+    """Probe every id on one fdcanusb, then read the config registers of the motors found."""
+    transport = moteus.Fdcanusb(device)
+    probe_timeout = AdaptiveTimeout(timeout, 0.005, timeout)
+    st = time.monotonic()
+    found = await probe(transport, list(ids), probe_timeout)
+    motors = {str(i): await read_config(transport, i, registers, 0.1) for i in found}
+    return {
+        'motors': motors,
+        'scan_time': time.monotonic() - st,
+        'round_trip': probe_timeout.round_trip,
+    }
+
+
+def compare(inventory: dict, config: str) -> dict:
+    """Difference between the motors found and the topology configuration."""
+    topology = load_topology(config)
+    found = {int(i): device for device, d in inventory.items() for i in d['motors']}
+    expected = {m.id: topology.buses[topology.bus_of(m)].device for m in topology.motors}
+    return {
+        'missing': sorted(set(expected) - set(found)),
+        'unexpected': sorted(set(found) - set(expected)),
+        'misplaced': [
+            {'id': i, 'expected': expected[i], 'found': found[i]}
+            for i in sorted(set(expected) & set(found))
+            if expected[i] and expected[i] != found[i]
+        ],
+    }
+
+
+async def main(args=None):
+    parser = argparse.ArgumentParser(description='Find all moteus controllers on all fdcanusb adapters and print a JSON inventory.')
+    parser.add_argument('--devices', nargs='+', default=None, help='fdcanusb serial paths, all attached adapters by default')
+    parser.add_argument('--max-id', type=int, default=127, help='probe ids 1..max-id')
+    parser.add_argument('--timeout', type=float, default=0.02, help='probe timeout before the round trip is known (s)')
+    parser.add_argument('--registers', nargs='*', default=DEFAULT_REGISTERS, help='config registers to read')
+    parser.add_argument('--config', nargs='?', const='', default=None, help='compare with an arm topology yaml, the installed arm_mapping.yaml if no path is given')
+    parser.add_argument('--output', default=None, help='write the inventory to a file instead of stdout')
+    parsed = parser.parse_args(args)
+
+    devices = parsed.devices or sorted(glob.glob('/dev/serial/by-id/*fdcanusb*'))
+    if not devices:
+        print('No fdcanusb found.', file=sys.stderr)
+        return
+    ids = range(1, parsed.max_id + 1)
+    scans = await asyncio.gather(*[scan_device(d, ids, parsed.registers, parsed.timeout) for d in devices])
+    result = {'devices': dict(zip(devices, scans))}
+    if parsed.config is not None:
+        result['topology'] = compare(result['devices'], parsed.config or None)
+
+    text = json.dumps(result, indent=4)
+    if parsed.output:
+        with open(parsed.output, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    asyncio.run(main(sys.argv[1:]))
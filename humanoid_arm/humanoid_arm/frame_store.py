@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Tuple
+
+# Every save appends a version, the frame is its latest version
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS frame (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    time REAL NOT NULL,
+    motor_id BLOB NOT NULL,
+    position BLOB NOT NULL,
+    PRIMARY KEY (name, version)
+);
+CREATE TABLE IF NOT EXISTS motion (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    time REAL NOT NULL,
+    motor_id BLOB NOT NULL,
+    waypoints BLOB NOT NULL,
+    durations BLOB NOT NULL,
+    PRIMARY KEY (name, version)
+);
+CREATE TABLE IF NOT EXISTS calibration (
+    version INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    motor_id BLOB NOT NULL,
+    offset BLOB NOT NULL,
+    abs_position BLOB NOT NULL
+);
+'''
+# Offsets written by the calibration service before the library existed, imported as a calibration
+_CALIBRATION_JSON = 'calibration.json'
+_LATEST = '''
+SELECT name, motor_id, position FROM frame AS f
+WHERE version = (SELECT MAX(version) FROM frame WHERE name = f.name)
+ORDER BY name
+'''
+_LATEST_MOTION = '''
+SELECT name, motor_id, waypoints, durations FROM motion AS f
+WHERE version = (SELECT MAX(version) FROM motion WHERE name = f.name)
+ORDER BY name
+'''
+
+
+class FrameStore:
+    def __init__(self, path: str, motor_id: np.ndarray) -> None:
+        """Arm frame library in a single SQLite file, kept in memory as a frame x motor table.
+
+        Args:
+            path (str): library file, created if missing.
+            motor_id (np.ndarray): motor ids, the columns of the table.
+        """
+        self._motor_id = np.asarray(motor_id)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+        # (name: row, table), replaced as a whole on every change so readers never see a half updated store
+        self._frames: Tuple[Dict[str, int], np.ndarray] = ({}, np.zeros((0, len(self._motor_id))))
+        # name: (waypoints, durations) of the recorded motions
+        self._motions: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._data_version = None
+        self.reloads = 0
+        self.refresh()
+
+    def _row(self, motor_id: bytes, position: bytes) -> np.ndarray:
+        # Frames saved with another set of motors leave NaN in the missing columns
+        frame = dict(zip(np.frombuffer(motor_id, dtype=np.int64).tolist(), np.frombuffer(position, dtype=np.float64).tolist()))
+        return np.array([frame.get(i, np.nan) for i in self._motor_id.tolist()], dtype=float)
+
+    def _motion(self, motor_id: bytes, waypoints: bytes, durations: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        durations = np.frombuffer(durations, dtype=np.float64)
+        rows = np.frombuffer(waypoints, dtype=np.float64).reshape(-1, len(durations) + 1)
+        index = {int(m): i for i, m in enumerate(np.frombuffer(motor_id, dtype=np.int64))}
+        waypoints = np.full((len(self._motor_id), rows.shape[1]), np.nan)
+        for i, m in enumerate(self._motor_id.tolist()):
+            if m in index:
+                waypoints[i] = rows[index[m]]
+        return waypoints, durations.copy()
+
+    def refresh(self) -> bool:
+        """Reload the library if another connection committed to it since the last refresh.
+
+        Returns:
+            bool: True if the store changed.
+        """
+        with self._lock:
+            data_version = self._db.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return False
+            rows = self._db.execute(_LATEST).fetchall()
+            self._frames = (
+                {name: i for i, (name, _, _) in enumerate(rows)},
+                np.vstack([self._row(m, p) for _, m, p in rows]) if rows else np.zeros((0, len(self._motor_id)))
+            )
+            self._motions = {name: self._motion(m, w, d) for name, m, w, d in self._db.execute(_LATEST_MOTION).fetchall()}
+            self._data_version = data_version
+            self.reloads += 1
+            return True
+
+    def save_many(self, frames: Dict[str, np.ndarray], motor_id: np.ndarray = None) -> None:
+        """Save frames in one transaction, all or none of them are written.
+
+        Args:
+            frames (Dict[str, np.ndarray]): position of every motor by frame name.
+            motor_id (np.ndarray, optional): motor ids of the positions, the ids of the store by default.
+        """
+        motor_id = self._motor_id if motor_id is None else np.asarray(motor_id)
+        motor_blob = motor_id.astype(np.int64).tobytes()
+        blobs = {name: np.asarray(position, dtype=np.float64).tobytes() for name, position in frames.items()}
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for name, position in blobs.items():
+                    self._db.execute(
+                        'INSERT INTO frame SELECT ?, COALESCE(MAX(version), 0) + 1, ?, ?, ? FROM frame WHERE name = ?',
+                        (name, now, motor_blob, position, name)
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            index, table = self._frames
+            index = dict(index)
+            table = table.copy()
+            for name, position in blobs.items():
+                row = self._row(motor_blob, position)
+                if name in index:
+                    table[index[name]] = row
+                else:
+                    index[name] = len(table)
+                    table = np.vstack([table, row])
+            self._frames = (index, table)
+
+    def save(self, name: str, position: np.ndarray) -> None:
+        """Save a new version of a frame.
+
+        Args:
+            name (str): frame name.
+            position (np.ndarray): position of every motor, in the motor id order of the store.
+        """
+        self.save_many({name: position})
+
+    def save_motion(self, name: str, waypoints: np.ndarray, durations: np.ndarray) -> None:
+        """Save a new version of a recorded motion.
+
+        Args:
+            name (str): motion name.
+            waypoints (np.ndarray): (n, k + 1) minco waypoints, rows in the motor id order of the store.
+            durations (np.ndarray): (k,) segment durations (s).
+        """
+        waypoints = np.ascontiguousarray(waypoints, dtype=np.float64)
+        durations = np.ascontiguousarray(durations, dtype=np.float64)
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO motion SELECT ?, COALESCE(MAX(version), 0) + 1, ?, ?, ?, ? FROM motion WHERE name = ?',
+                (name, time.time(), self._motor_id.astype(np.int64).tobytes(), waypoints.tobytes(), durations.tobytes(), name)
+            )
+            self._motions = {**self._motions, name: (waypoints, durations)}
+
+    def get_motion(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(waypoints, durations) of a recorded motion, None if it is missing or lacks a motor."""
+        if (motion := self._motions.get(name)) is None or np.isnan(motion[0]).any():
+            return None
+        return motion
+
+    def motion_names(self) -> List[str]:
+        return list(self._motions)
+
+    def save_calibration(self, offset: np.ndarray, abs_position: np.ndarray) -> None:
+        """Save a new version of the arm calibration, kept apart from the frames.
+
+        Args:
+            offset (np.ndarray): joint offset of every motor, in the motor id order of the store.
+            abs_position (np.ndarray): absolute encoder position of every motor at calibration.
+        """
+        offset = np.ascontiguousarray(offset, dtype=np.float64)
+        abs_position = np.ascontiguousarray(abs_position, dtype=np.float64)
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO calibration SELECT COALESCE(MAX(version), 0) + 1, ?, ?, ?, ? FROM calibration',
+                (time.time(), self._motor_id.astype(np.int64).tobytes(), offset.tobytes(), abs_position.tobytes())
+            )
+
+    def get_calibration(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(offset, abs_position) of the latest calibration, None if there is none or it lacks a motor offset.
+
+        abs_position is NaN for the motors whose absolute encoder was not read at calibration.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT motor_id, offset, abs_position FROM calibration ORDER BY version DESC LIMIT 1').fetchone()
+        if row is None:
+            return None
+        offset, abs_position = self._row(row[0], row[1]), self._row(row[0], row[2])
+        if np.isnan(offset).any():
+            return None
+        return offset, abs_position
+
+    def get(self, name: str, version: int = None) -> np.ndarray:
+        """Position of every motor in a frame, None if the frame is missing or lacks a motor.
+
+        Args:
+            name (str): frame name.
+            version (int, optional): version from history(), the latest by default.
+        """
+        if version is not None:
+            with self._lock:
+                row = self._db.execute('SELECT motor_id, position FROM frame WHERE name = ? AND version = ?', (name, version)).fetchone()
+            frame = None if row is None else self._row(*row)
+        else:
+            index, table = self._frames
+            frame = None if (i := index.get(name)) is None else table[i]
+        if frame is None or np.isnan(frame).any():
+            return None
+        return frame
+
+    def history(self, name: str) -> List[Tuple[int, float]]:
+        """(version, save time) of every version of a frame, oldest first."""
+        with self._lock:
+            return self._db.execute('SELECT version, time FROM frame WHERE name = ? ORDER BY version', (name,)).fetchall()
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def names(self) -> List[str]:
+        return list(self._frames[0])
+
+    def import_json(self, directory: str, newer_only: bool = False) -> int:
+        """Save every {motor id: position} json file of a directory as a frame, in one transaction.
+
+        The legacy calibration.json holds joint offsets, it is saved as a calibration without
+        absolute encoder reference instead of a frame.
+
+        Args:
+            directory (str): directory of the json files.
+            newer_only (bool, optional): skip files older than the latest version of their frame,
+                or equal to it, so importing at every start only picks up edited and new files.
+
+        Returns:
+            int: number of imported files.
+        """
+        with self._lock:
+            saved = dict(self._db.execute('SELECT name, MAX(time) FROM frame GROUP BY name').fetchall())
+            calibrated = self._db.execute('SELECT MAX(time) FROM calibration').fetchone()[0]
+        frames = {}
+        calibration = None
+        for f in sorted(os.listdir(directory)):
+            if not f.endswith('.json'):
+                continue
+            path = os.path.join(directory, f)
+            name = f[:-5]
+            latest = calibrated if f == _CALIBRATION_JSON else saved.get(name)
+            if newer_only and latest is not None and os.path.getmtime(path) <= latest:
+                continue
+            with open(path, 'r') as fp:
+                frame_dict = json.load(fp)
+            position = np.array([frame_dict.get(str(i), np.nan) for i in self._motor_id], dtype=float)
+            if f == _CALIBRATION_JSON:
+                calibration = position
+                continue
+            index, table = self._frames
+            if newer_only and name in index and np.array_equal(table[index[name]], position, equal_nan=True):
+                continue
+            frames[name] = position
+        if frames:
+            self.save_many(frames)
+        if calibration is not None:
+            self.save_calibration(calibration, np.full_like(calibration, np.nan))
+        return len(frames) + (calibration is not None)
+
+    def export_json(self, directory: str) -> int:
+        """Write the latest version of every frame as a {motor id: position} json file.
+
+        Returns:
+            int: number of exported frames.
+        """
+        os.makedirs(directory, exist_ok=True)
+        index, table = self._frames
+        for name, i in index.items():
+            frame_dict = {int(m): p for m, p in zip(self._motor_id, table[i].tolist()) if not np.isnan(p)}
+            with open(os.path.join(directory, f'{name}.json'), 'w') as fp:
+                fp.write(json.dumps(frame_dict, indent=4))
+        return len(index)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Manage the arm frame library.')
+    parser.add_argument('library', help='frame library file')
+    parser.add_argument('--motors', nargs='+', type=int, default=list(range(14, 24)), help='motor ids of the frames')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='list the frames')
+    import_parser = subparsers.add_parser('import', help='import a directory of json frames')
+    import_parser.add_argument('directory')
+    import_parser.add_argument('--newer', action='store_true', help='only import new frames and files modified since the last save')
+    export_parser = subparsers.add_parser('export', help='export the frames to a directory of json files')
+    export_parser.add_argument('directory')
+    history_parser = subparsers.add_parser('history', help='list the versions of a frame')
+    history_parser.add_argument('name')
+    parsed = parser.parse_args(args)
+
+    store = FrameStore(parsed.library, parsed.motors)
+    if parsed.command == 'list':
+        for name in store.names():
+            print(name)
+        for name in store.motion_names():
+            waypoints, durations = store._motions[name]
+            print(f'{name} (motion, {waypoints.shape[1]} waypoints, {durations.sum():.2f} s)')
+    elif parsed.command == 'import':
+        print(f'Imported {store.import_json(parsed.directory, parsed.newer)} files.')
+    elif parsed.command == 'export':
+        print(f'Exported {store.export_json(parsed.directory)} frames.')
+    elif parsed.command == 'history':
+        for version, t in store.history(parsed.name):
+            print(f'{version:4d} {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))} {store.get(parsed.name, version)}')
+    store.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
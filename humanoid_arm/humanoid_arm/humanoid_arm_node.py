@@ -1,291 +1,558 @@
 import rclpy
 from rclpy.node import Node
 import rclpy.qos
-import moteus
-from dataclasses import dataclass
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.action import ActionServer, CancelResponse, GoalResponse
 import threading
 import asyncio
-from humanoid_interface.msg import MotorControl, MotorFeedback, MotorControlBatch
-from typing import Dict
-from humanoid_interface.srv import PlayArm, GetArmFrameList, TeachArm, PlayArmSequence
-from std_srvs.srv import SetBool, Empty
+from humanoid_interface.msg import MotorControl, MotorFeedbackBatch, MotorControlBatch
+from sensor_msgs.msg import JointState
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from humanoid_interface.srv import PlayArm, GetArmFrameList, TeachArm, PlayArmSequence, RecordArm
+from humanoid_interface.action import PlayArm as PlayArmAction, PlayArmSequence as PlayArmSequenceAction
+from std_srvs.srv import SetBool, Empty, Trigger
 from ament_index_python.packages import get_package_share_directory
 import os
 from .joint_trajectory_planner import MINCOTrajectory, FifthOrderTrajectory
+from .topology import ArmTopology, parse_topology, load_topology
+from .scheduler import DeadlineScheduler, Histogram, TrackingError
+from .arm_controller import ArmController, ControllerOptions
+from .realtime import RealtimeArmController, RealtimeOptions
+from .frame_store import FrameStore
+from .recorder import save_recording
 import numpy as np
-import json
 import time
-from itertools import chain
+from typing import Union
+from collections import OrderedDict
+from rclpy.parameter import Parameter
 
 
-@dataclass
-class MotorDataClass:
-    id: int
-    controller: moteus.Controller
-    target: np.ndarray
-    feedback: np.ndarray
-    reverse: bool = False
-    offset: float = 0.0
-    initialized: bool = False
+class TrajectoryCache:
+    def __init__(self, max_size: int) -> None:
+        """LRU cache of solved trajectories, shared by the reentrant play callbacks.
+
+        Args:
+            max_size (int): maximum number of cached trajectories.
+        """
+        self._max_size = max_size
+        self._trajectories = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            trajectory = self._trajectories.get(key)
+            if trajectory is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._trajectories.move_to_end(key)
+            return trajectory
+
+    def put(self, key, trajectory) -> None:
+        with self._lock:
+            self._trajectories[key] = trajectory
+            self._trajectories.move_to_end(key)
+            while len(self._trajectories) > self._max_size:
+                self._trajectories.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._trajectories.clear()
+
+    def __str__(self) -> str:
+        return f'hits: {self.hits}, misses: {self.misses}, size: {len(self._trajectories)}/{self._max_size}'
 
 
 class HumanoidArmNode(Node):
     def __init__(self):
         super().__init__('humanoid_arm', allow_undeclared_parameters=True, automatically_declare_parameters_from_overrides=True)
-        self._teach_mode = True
         self._control_thread = threading.Thread(target=asyncio.run, args=[self._control_loop()])
         self._control_thread.start()
     
     def _node_initialize(self):
         self._frames_data_path = os.path.join(get_package_share_directory('humanoid_arm'), 'frames')
-        self._play_service = self.create_service(PlayArm, "arm/play", self._play_callback)
-        self._play_sequence_service = self.create_service(PlayArmSequence, "arm/play_sequence", self._play_sequence_callback)
+        # Frames are served from memory, the library is only checked for commits of other processes
+        self._frame_store = FrameStore(self._get_parameter('frame_library', os.path.join(self._frames_data_path, 'frames.db')), self._motors.id)
+        # Json frames added or edited since the last start are saved as new versions
+        if imported := self._frame_store.import_json(self._frames_data_path, newer_only=True):
+            self.get_logger().info(f'Imported {imported} json files into the frame library.')
+        self._frame_refresh_timer = self.create_timer(self._get_parameter('frame_refresh_period', 1.0), self._refresh_frames)
+        # Restore the persisted calibration, it is verified against the absolute encoders once the motors answer
+        self._calibration_drift_threshold = self._get_parameter('calibration_drift_threshold', 0.05)
+        self._calibration_deadline = time.monotonic() + self._get_parameter('calibration_verify_timeout', 5.0)
+        self._calibration_status = 'pending'
+        if (calibration := self._frame_store.get_calibration()) is not None:
+            self._motors.offset[:] = calibration[0]
+        self._calibration_timer = self.create_timer(0.2, self._verify_calibration)
+        # Teach mode demonstrations, the raw feedback is kept next to the fitted motion
+        self._recording_path = self._get_parameter('recording_path', os.path.join(self._frames_data_path, 'recordings'))
+        self._recording_max_duration = self._get_parameter('recording_max_duration', 300.0)
+        self._recording_tolerance = self._get_parameter('recording_tolerance', 0.01)
+        # Waypoint budget of the fit per second of recording
+        self._recording_waypoint_rate = self._get_parameter('recording_waypoint_rate', 10.0)
+        self._recording_name = None
+        self._recording_lock = threading.Lock()
+        self._trajectory_cache = TrajectoryCache(self._get_parameter('trajectory_cache_size', 32))
+        # Start states closer than this (rad) share cached trajectories
+        self._trajectory_cache_quantum = self._get_parameter('trajectory_cache_quantum', 0.01)
+        # Joint limits for time optimal sequences, scalar or one value per joint
+        self._joint_max_velocity = np.array(self._get_parameter('joint_max_velocity', 3.0))
+        self._joint_max_acceleration = np.array(self._get_parameter('joint_max_acceleration', 10.0))
+        self._joint_max_torque = np.array(self._get_parameter('joint_max_torque', 8.0))
+        self._joint_inertia = np.array(self._get_parameter('joint_inertia', 0.0))
+        # Deceleration used to brake a canceled trajectory (rad/s^2)
+        self._cancel_deceleration = self._get_parameter('cancel_deceleration', 5.0)
+        self._action_feedback_period = 1.0 / self._get_parameter('action_feedback_rate', 10.0)
+        self._play_callback_group = ReentrantCallbackGroup()
+        self._play_service = self.create_service(PlayArm, "arm/play", self._play_callback, callback_group=self._play_callback_group)
+        self._play_sequence_service = self.create_service(PlayArmSequence, "arm/play_sequence", self._play_sequence_callback, callback_group=self._play_callback_group)
         self._teach_mode_service = self.create_service(SetBool, "arm/teach_mode", self._teach_mode_callback)
         self._teach_service = self.create_service(TeachArm, "arm/teach", self._teach_callback)
+        # Fitting a long recording takes a while, it must not hold back the other services
+        self._record_service = self.create_service(RecordArm, "arm/record", self._record_callback, callback_group=ReentrantCallbackGroup())
         self._get_frame_list_service = self.create_service(GetArmFrameList, "arm/get_frame_list", self._get_frame_list_callback)
         self._calibration_service = self.create_service(Empty, "arm/calibration", self._calibration_callback)
-        self._motor_feedback_publisher = self.create_publisher(MotorFeedback, "motor_feedback", rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
+        self._calibration_status_service = self.create_service(Trigger, "arm/calibration_status", self._calibration_status_callback)
+        self._play_action_server = ActionServer(
+            self, PlayArmAction, "arm/play", self._play_action_execute_callback,
+            goal_callback=self._play_action_goal_callback, cancel_callback=self._action_cancel_callback, callback_group=self._play_callback_group
+        )
+        self._play_sequence_action_server = ActionServer(
+            self, PlayArmSequenceAction, "arm/play_sequence", self._play_sequence_action_execute_callback,
+            goal_callback=self._play_sequence_action_goal_callback, cancel_callback=self._action_cancel_callback, callback_group=self._play_callback_group
+        )
+        self._joint_state_msg = JointState(name=self._get_parameter('joint_names', [f'motor_{i}' for i in self._motors.id]))
+        self._motor_feedback_batch_msg = MotorFeedbackBatch(id=self._motors.id.tolist())
+        self._motor_feedback_batch_publisher = self.create_publisher(MotorFeedbackBatch, "motor_feedback_batch", rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
+        self._joint_state_publisher = self.create_publisher(JointState, "arm/joint_states", rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
         self._motor_control_subscription = self.create_subscription(MotorControl, "motor_control", self._motor_control_callback, rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
         self._motor_control_batch_subscription = self.create_subscription(MotorControlBatch, "motor_control_batch", self._motor_control_batch_callback, rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
+        # Control loop health and timing, histograms cover one diagnostics period
+        self._diagnostics_publisher = self.create_publisher(DiagnosticArray, "diagnostics", rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
+        self._diagnostics_timer = self.create_timer(self._get_parameter('diagnostics_period', 1.0), self._publish_diagnostics)
     
+    def _get_parameter(self, name, default):
+        return self.get_parameter_or(name, Parameter(name, value=default)).value
+
+    def _publish_feedback(self) -> None:
+        stamp = self.get_clock().now().to_msg()
+        position = self._motors.feedback[0].tolist()
+        velocity = self._motors.feedback[1].tolist()
+        torque = self._motors.feedback[2].tolist()
+        self._motor_feedback_batch_msg.stamp = stamp
+        self._motor_feedback_batch_msg.position = position
+        self._motor_feedback_batch_msg.velocity = velocity
+        self._motor_feedback_batch_msg.torque = torque
+        self._motor_feedback_batch_publisher.publish(self._motor_feedback_batch_msg)
+        self._joint_state_msg.header.stamp = stamp
+        self._joint_state_msg.position = position
+        self._joint_state_msg.velocity = velocity
+        self._joint_state_msg.effort = torque
+        self._joint_state_publisher.publish(self._joint_state_msg)
+
+    def _publish_diagnostics(self) -> None:
+        msg = DiagnosticArray()
+        msg.header.stamp = self.get_clock().now().to_msg()
+        for b, health in enumerate(self._bus_health):
+            status = DiagnosticStatus(name=f'humanoid_arm: bus {health.name}', hardware_id=health.name)
+            index = self._bus_index[b]
+            if not health.healthy:
+                status.level, status.message = DiagnosticStatus.ERROR, 'unhealthy'
+            elif np.any(self._motors.fault[index]):
+                status.level, status.message = DiagnosticStatus.ERROR, 'motor fault'
+            elif health.consecutive_timeouts:
+                status.level, status.message = DiagnosticStatus.WARN, 'timeout'
+            else:
+                status.level, status.message = DiagnosticStatus.OK, 'ok'
+            values = {
+                'rate': health.rate,
+                'cycles': health.cycles,
+                'timeouts': health.timeouts,
+                'overruns': health.overruns,
+            }
+            sum_sq, count, maximum = health.tracking.take()
+            rms = TrackingError.rms(sum_sq, count)
+            values['tracking_rms'] = TrackingError.rms(sum_sq[index].sum(), count[index].sum())
+            values['tracking_max'] = maximum[index].max(initial=0.0)
+            for i in index:
+                values[f'motor_{self._motors.id[i]}_temperature'] = self._motors.temperature[i]
+                values[f'motor_{self._motors.id[i]}_fault'] = self._motors.fault[i]
+                values[f'motor_{self._motors.id[i]}_tracking_rms'] = rms[i]
+                values[f'motor_{self._motors.id[i]}_tracking_max'] = maximum[i]
+            for name, histogram in (('latency', health.latency), ('jitter', health.jitter)):
+                counts, maximum = histogram.take()
+                values[f'{name}_p50_ms'] = Histogram.percentile(counts, 50)
+                values[f'{name}_p99_ms'] = Histogram.percentile(counts, 99)
+                values[f'{name}_max_ms'] = maximum
+                values.update({f'{name}_{label}': int(c) for label, c in zip(Histogram.labels(), counts)})
+            status.values = [KeyValue(key=k, value=str(v)) for k, v in values.items()]
+            msg.status.append(status)
+        self._diagnostics_publisher.publish(msg)
+
     def _calibration_callback(self, request: Empty.Request, response: Empty.Response) -> Empty.Response:
-        for motor in self._motors.values():
-            motor.offset += motor.feedback[0]
-        frame_dict = {m.id: m.offset for m in self._motors.values()}
-        with open(os.path.join(self._frames_data_path, 'calibration.json'), 'w') as fp:
-            fp.write(json.dumps(frame_dict, indent=4))
+        self._motors.offset += self._motors.reverse * self._motors.feedback[0]
+        # The absolute encoders at this pose let the next start verify the offsets
+        self._frame_store.save_calibration(self._motors.offset, self._motors.abs_position)
+        self._set_calibration_status('calibrated', 'Arm calibrated.')
+        return response
+
+    def _set_calibration_status(self, status: str, message: str) -> None:
+        self._calibration_status = status
+        self._calibration_timer.cancel()
+        if status == 'calibrated':
+            self.get_logger().info(message)
+        else:
+            self.get_logger().warning(message)
+
+    def _verify_calibration(self) -> None:
+        if (calibration := self._frame_store.get_calibration()) is None:
+            self._set_calibration_status('uncalibrated', 'No persisted calibration, manual calibration required.')
+            return
+        # Motors calibrated without absolute encoder reading keep their restored offsets unverified
+        offset, abs_reference = calibration
+        check = np.isfinite(abs_reference)
+        if not np.any(check):
+            self._set_calibration_status('unverified', 'Calibration restored without absolute encoder reference, not verified.')
+            return
+        ready = self._motors.initialized & np.isfinite(self._motors.abs_position)
+        if not np.all(ready[check]):
+            if time.monotonic() >= self._calibration_deadline:
+                self._set_calibration_status('unverified', f'Motor {self._motors.id[check & ~ready].tolist()} absolute position not read, calibration restored but not verified.')
+            return
+        drift = np.where(check, self._motors.calibration_drift(offset, abs_reference), 0.0)
+        if np.any(drift > self._calibration_drift_threshold):
+            drifted = {int(i): round(float(d), 3) for i, d in zip(self._motors.id, drift) if d > self._calibration_drift_threshold}
+            self._set_calibration_status('drifted', f'Calibration drift {drifted} rad exceeds {self._calibration_drift_threshold} rad, manual calibration required.')
+        elif not np.all(check):
+            self._set_calibration_status('unverified', f'Calibration restored, motor {self._motors.id[~check].tolist()} without absolute encoder reference, max drift of the others {drift.max():.4f} rad.')
+        else:
+            self._set_calibration_status('calibrated', f'Calibration restored, max drift {drift.max():.4f} rad.')
+
+    def _calibration_status_callback(self, request: Trigger.Request, response: Trigger.Response) -> Trigger.Response:
+        response.success = self._calibration_status == 'calibrated'
+        response.message = self._calibration_status
         return response
 
+    def _refresh_frames(self) -> None:
+        if self._frame_store.refresh():
+            self._trajectory_cache.clear()
+            self.get_logger().info(f'Frame library changed, {len(self._frame_store.names())} frames loaded.')
+
     def _save_frame(self, frame_name) -> bool:
-        frame_dict = {m.id: m.feedback[0] for m in self._motors.values()}
-        with open(os.path.join(self._frames_data_path, f'{frame_name}.json'), 'w') as fp:
-            fp.write(json.dumps(frame_dict, indent=4))
+        self._frame_store.save(frame_name, self._motors.feedback[0])
+        self._trajectory_cache.clear()
         return True
     
     def _teach_callback(self, request: TeachArm.Request, response: TeachArm.Response) -> TeachArm.Response:
         response.result = self._save_frame(request.frame_name)
         return response
+
+    def _record_callback(self, request: RecordArm.Request, response: RecordArm.Response) -> RecordArm.Response:
+        with self._recording_lock:
+            if request.record:
+                if not self._controller.teach_mode or self._recording_name is not None:
+                    response.result = False
+                    return response
+                rate = max(h.rate for h in self._bus_health)
+                self._controller.start_recording(int(self._recording_max_duration * rate))
+                self._recording_name = request.motion_name
+                response.result = True
+                return response
+            if self._recording_name is None or (recording := self._controller.stop_recording()) is None:
+                self._recording_name = None
+                response.result = False
+                return response
+            t, feedback = recording
+            name = request.motion_name or self._recording_name
+            self._recording_name = None
+        response.samples = len(t)
+        if len(t) < 2:
+            response.result = False
+            return response
+        os.makedirs(self._recording_path, exist_ok=True)
+        save_recording(os.path.join(self._recording_path, f'{name}.npz'), self._motors.id, t, feedback)
+
+        # A replay is the fitted waypoints and durations instead of every sample
+        tolerance = request.tolerance or self._recording_tolerance
+        max_waypoints = max(int((t[-1] - t[0]) * self._recording_waypoint_rate), 2)
+        traj = MINCOTrajectory.fit(t, feedback[:, 0].T, tolerance, max_waypoints=max_waypoints)
+        response.waypoints = len(traj.T) + 1
+        response.max_error = float(traj.max_error)
+        if traj.max_error > tolerance:
+            # Only the raw recording is saved, a larger tolerance or a slower demonstration may fit
+            self.get_logger().warning(f'Motion {name} not saved, {response.waypoints} waypoints leave a max error of {traj.max_error:.4f} rad > {tolerance} rad.')
+            response.result = False
+            return response
+        self._frame_store.save_motion(name, traj.X, traj.T)
+        self._trajectory_cache.clear()
+        response.result = True
+        self.get_logger().info(f'Motion {name} recorded, {len(t)} samples fitted with {response.waypoints} waypoints, max error {traj.max_error:.4f} rad.')
+        return response
     
     def _teach_mode_callback(self, request: SetBool.Request, response: SetBool.Response) -> SetBool.Response:
         if not request.data:
             # Reset all motor target to current position
-            for motor in self._motors.values():
-                motor.target = motor.feedback.copy()
-        self._teach_mode = request.data
+            self._motors.target[0] = self._motors.feedback[0]
+            self._motors.target[1:] = 0.0
+        self._controller.teach_mode = request.data
         response.success = True
         return response
 
     def _get_frame_list_callback(self, request: GetArmFrameList.Request, response: GetArmFrameList.Response) -> GetArmFrameList.Response:
-        response.frames = []
-        for f in os.listdir(self._frames_data_path):
-            if f.endswith('.json'):
-                response.frames.append(f[:-5])
+        response.frames = self._frame_store.names() + self._frame_store.motion_names()
         return response
     
-    def _play_to_frame(self, frame_name: str, duration: float) -> bool:
-        try:
-            with open(os.path.join(self._frames_data_path, f'{frame_name}.json'), 'r') as fp:
-                frame_dict = json.load(fp)
-        except RuntimeError:
-            return False
-        motor_id = list(self._motors.keys())
-        traj = FifthOrderTrajectory(
-            np.column_stack([self._motors[i].feedback for i in motor_id]),
+    def _commanded_state(self, t: float) -> np.ndarray:
+        """Commanded state of all motors.
+
+        Args:
+            t (float): time.monotonic() timestamp.
+
+        Returns:
+            np.ndarray: 3xn matrix, the rows of the matrix are position, velocity and acceleration.
+        """
+        if (state := self._trajectory_executor.state(t)) is not None:
+            return state
+        if self._controller.teach_mode:
+            return np.vstack([self._motors.feedback[0], np.zeros((2, len(self._motors)))])
+        return self._motors.target.copy()
+
+    def _frame_exists(self, frame_name: str) -> bool:
+        # Recorded motions are listed and played like frames
+        return frame_name in self._frame_store or self._frame_store.get_motion(frame_name) is not None
+
+    @staticmethod
+    def _valid_durations(durations) -> bool:
+        # Zero or negative durations give NaN coefficients
+        return all(d > 0 and np.isfinite(d) for d in durations)
+
+    def _plan_to_frame(self, frame_name: str, duration: float, st: float) -> Union[FifthOrderTrajectory, MINCOTrajectory]:
+        if frame_name not in self._frame_store and self._frame_store.get_motion(frame_name) is not None:
+            # The start of the motion is reached in the given duration, then it is replayed as recorded
+            return self._plan_sequence([frame_name], [duration], False, st)
+        if not self._valid_durations([duration]) or (frame := self._frame_store.get(frame_name)) is None:
+            return None
+        return FifthOrderTrajectory(
+            self._commanded_state(st),
             np.vstack([
-                [frame_dict[str(i)] for i in motor_id],
-                np.zeros((2, len(motor_id)))
+                frame,
+                np.zeros((2, len(self._motors)))
             ]),
             duration
         )
-        st = time.time()
-        while (t := (time.time() - st)) < duration:
-            p = traj.plan(t)
-            for i in range(len(motor_id)):
-                self._motors[motor_id[i]].target = p[:, i]
-            time.sleep(0.01)
-        return True
+
+    def _plan_sequence(self, frame_names, durations, time_optimal: bool, st: float) -> MINCOTrajectory:
+        if not time_optimal and (len(frame_names) != len(durations) or not self._valid_durations(durations)):
+            return None
+        # Nearby start states share a trajectory planned from the quantized state, re-anchored to the actual one
+        state = self._commanded_state(st)
+        start = np.round(state / self._trajectory_cache_quantum).astype(int)
+        key = (tuple(frame_names), None if time_optimal else tuple(durations), start.tobytes())
+        if (traj := self._trajectory_cache.get(key)) is None:
+            p0, v0, a0 = start * self._trajectory_cache_quantum
+            X = [np.vstack(p0)]
+            T = []
+            for i, frame_name in enumerate(frame_names):
+                if (frame := self._frame_store.get(frame_name)) is not None:
+                    X.append(np.vstack(frame))
+                    T.append(durations[i:i + 1])
+                elif (motion := self._frame_store.get_motion(frame_name)) is not None:
+                    # A recorded motion is reached in its duration, then played as recorded
+                    X.append(motion[0])
+                    T.append(np.concatenate([durations[i:i + 1], motion[1]]))
+                else:
+                    return None
+            if time_optimal:
+                traj = MINCOTrajectory.time_optimal(
+                    np.hstack(X),
+                    self._joint_max_velocity,
+                    self._joint_max_acceleration,
+                    self._joint_max_torque,
+                    self._joint_inertia,
+                    v0,
+                    a0
+                )
+                self.get_logger().info(f'Time optimal durations: {traj.T}.')
+            else:
+                traj = MINCOTrajectory(np.hstack(X), np.concatenate(T), v0, a0)
+            self._trajectory_cache.put(key, traj)
+        self.get_logger().debug(f'Trajectory cache {self._trajectory_cache}.')
+        return traj.anchored(state)
 
     def _play_sequence_callback(self, request: PlayArmSequence.Request, response: PlayArmSequence.Response) -> PlayArmSequence.Response:
-        if len(request.frame_name) != len(request.duration):
-            response.result = False
-            return response
-        motor_id = list(self._motors.keys())
-        X = [np.vstack([self._motors[i].feedback[0] for i in motor_id])]
-        T = []
-        for frame_name, duration in zip(request.frame_name, request.duration):
-            try:
-                with open(os.path.join(self._frames_data_path, f'{frame_name}.json'), 'r') as fp:
-                    frame_dict = json.load(fp)
-            except OSError:
-                response.result = False
-                return response
-            X.append(np.vstack([frame_dict[str(i)] for i in motor_id]))
-            T.append(duration)
-        traj = MINCOTrajectory(np.hstack(X), np.array(T))
-        st = time.time()
-        while (t := (time.time() - st)) < np.sum(T):
-            p = traj.plan(t)
-            for i in range(len(motor_id)):
-                self._motors[motor_id[i]].target = p[:, i]
-            time.sleep(0.01)
-        response.result = True
+        st = time.monotonic()
+        traj = self._plan_sequence(request.frame_name, request.duration, request.time_optimal, st)
+        response.result = traj is not None and self._wait_trajectory(self._trajectory_executor.submit(traj, st))
         return response
     
     def _play_callback(self, request: PlayArm.Request, response: PlayArm.Response) -> PlayArm.Response:
-        response.result = self._play_to_frame(request.frame_name, request.duration)
+        st = time.monotonic()
+        traj = self._plan_to_frame(request.frame_name, request.duration, st)
+        response.result = traj is not None and self._wait_trajectory(self._trajectory_executor.submit(traj, st))
         return response
-    
-    async def _detect_motor(self, motor: MotorDataClass) -> bool:
-        try:
-            await asyncio.wait_for(motor.controller.set_stop(), 1.0)
-        except (asyncio.exceptions.TimeoutError, ValueError):
-            return False
-        return True
+
+    @staticmethod
+    def _wait_trajectory(goal) -> bool:
+        goal.wait()
+        return goal.succeeded
+
+    def _play_action_goal_callback(self, goal: PlayArmAction.Goal) -> GoalResponse:
+        if not self._valid_durations([goal.duration]):
+            return GoalResponse.REJECT
+        return GoalResponse.ACCEPT if self._frame_exists(goal.frame_name) else GoalResponse.REJECT
+
+    def _play_sequence_action_goal_callback(self, goal: PlayArmSequenceAction.Goal) -> GoalResponse:
+        if not goal.time_optimal and (len(goal.frame_name) != len(goal.duration) or not self._valid_durations(goal.duration)):
+            return GoalResponse.REJECT
+        return GoalResponse.ACCEPT if all(self._frame_exists(f) for f in goal.frame_name) else GoalResponse.REJECT
+
+    def _action_cancel_callback(self, goal_handle) -> CancelResponse:
+        return CancelResponse.ACCEPT
+
+    def _play_action_execute_callback(self, goal_handle) -> PlayArmAction.Result:
+        st = time.monotonic()
+        traj = self._plan_to_frame(goal_handle.request.frame_name, goal_handle.request.duration, st)
+        return self._execute_action(goal_handle, traj, st, PlayArmAction)
+
+    def _play_sequence_action_execute_callback(self, goal_handle) -> PlayArmSequenceAction.Result:
+        st = time.monotonic()
+        request = goal_handle.request
+        traj = self._plan_sequence(request.frame_name, request.duration, request.time_optimal, st)
+        return self._execute_action(goal_handle, traj, st, PlayArmSequenceAction)
+
+    def _execute_action(self, goal_handle, traj, st: float, action_type):
+        result = action_type.Result()
+        if traj is None:
+            goal_handle.abort()
+            result.result = False
+            return result
+        goal = self._trajectory_executor.submit(traj, st)
+        feedback = action_type.Feedback()
+        while not goal.wait(self._action_feedback_period):
+            if goal_handle.is_cancel_requested:
+                self._cancel_trajectory(goal)
+                goal_handle.canceled()
+                result.result = False
+                return result
+            feedback.progress = goal.progress(time.monotonic())
+            feedback.tracking_error = float(np.max(np.abs(self._motors.target[0] - self._motors.feedback[0])))
+            goal_handle.publish_feedback(feedback)
+        if goal.succeeded:
+            goal_handle.succeed()
+        else:
+            # Preempted by a newer command
+            goal_handle.abort()
+        result.result = goal.succeeded
+        return result
+
+    def _cancel_trajectory(self, goal) -> None:
+        # Brake from the commanded state to rest with a constant deceleration
+        st = time.monotonic()
+        state = self._commanded_state(st)
+        duration = max(np.max(np.abs(state[1])) / self._cancel_deceleration, 0.1)
+        stop = FifthOrderTrajectory(
+            state,
+            np.vstack([state[0] + state[1] * duration / 2, np.zeros((2, state.shape[1]))]),
+            duration
+        )
+        self._trajectory_executor.cancel(goal, stop, st)
 
     def _motor_control_callback(self, msg: MotorControl) -> None:
-        if msg.id in self._motors and msg.control_type == MotorControl.MOTOR_POSITION_CONTROL:
-            self._motors[msg.id].target[0] = msg.position
+        if msg.id in self._motors.index and msg.control_type == MotorControl.MOTOR_POSITION_CONTROL:
+            self._motors.target[:, self._motors.index[msg.id]] = (msg.position, 0.0, 0.0)
 
     def _motor_control_batch_callback(self, msg: MotorControlBatch) -> None:
         for m in msg.control_messages:
             self._motor_control_callback(m)
     
-    async def _initialize_transport_and_motors(self) -> None:
-        # Create transport
-        self._transport_left = moteus.Fdcanusb('/dev/serial/by-id/usb-mjbots_fdcanusb_826543DB-if00')
-        self._transport_right = moteus.Fdcanusb('/dev/serial/by-id/usb-mjbots_fdcanusb_1EB12734-if00')
-
-        # create motors
-        self._motors: Dict[int, MotorDataClass] = {}
-        for i in range(14, 19):
-            self._motors[i] = MotorDataClass(id=i, controller=moteus.Controller(id=i, transport=self._transport_left), target=np.zeros(3), feedback=np.zeros(3))
-        for i in range(19, 24):
-            self._motors[i] = MotorDataClass(id=i, controller=moteus.Controller(id=i, transport=self._transport_right), target=np.zeros(3), feedback=np.zeros(3))
+    def _load_topology(self) -> ArmTopology:
+        parameters = {
+            f'{group}.{name}': p.value
+            for group in ('buses', 'motors')
+            for name, p in self.get_parameters_by_prefix(group).items()
+        }
+        if not parameters:
+            self.get_logger().warning('No arm topology parameters, fallback to the installed arm_mapping.yaml.')
+            return load_topology()
+        return parse_topology(parameters)
+
+    def _controller_options(self) -> ControllerOptions:
+        return ControllerOptions(
+            control_rate=self._get_parameter('control_rate', 200.0),
+            # Publish feedback every n control cycles
+            feedback_decimation=max(self._get_parameter('feedback_decimation', 1), 1),
+            # A bus is unhealthy after this many consecutive timeouts and retried every bus_retry_period (s)
+            bus_max_timeouts=self._get_parameter('bus_max_timeouts', 10),
+            bus_retry_period=self._get_parameter('bus_retry_period', 0.5),
+            # Temperature and fault are queried every n cycles of a bus, 0 to never query them
+            slow_query_decimation=self._get_parameter('slow_query_decimation', 100),
+            # Motor probes wait a few measured round trips, missing motors are probed again every discovery_retry_period (s)
+            discovery_timeout=self._get_parameter('discovery_timeout', 0.05),
+            discovery_retry_period=self._get_parameter('discovery_retry_period', 1.0),
+            # The simulated transport replaces every adapter for tests without hardware
+            simulated=self._get_parameter('simulated_transport', False),
+            simulation={
+                'latency': self._get_parameter('simulated_latency', 0.001),
+                'jitter': self._get_parameter('simulated_jitter', 0.0002),
+                'drop_rate': self._get_parameter('simulated_drop_rate', 0.0),
+                'time_constant': self._get_parameter('simulated_time_constant', 0.05),
+            },
+            gc_freeze=self._get_parameter('gc_freeze', False),
+            gc_threshold=self._get_parameter('gc_threshold', 0),
+            # Planned velocity and inertia * acceleration sent with every position, scalar or one gain per joint
+            velocity_feedforward_gain=self._get_parameter('velocity_feedforward_gain', 1.0),
+            torque_feedforward_gain=self._get_parameter('torque_feedforward_gain', 0.0),
+            joint_inertia=self._get_parameter('joint_inertia', 0.0)
+        )
+
+    async def _publish_feedback_loop(self, controller: RealtimeArmController) -> None:
+        """Publish the feedback of the real-time process at the rate the control loop would have."""
+        scheduler = DeadlineScheduler(controller.options.control_rate / controller.options.feedback_decimation)
+        while rclpy.ok() and controller.alive():
+            await scheduler.wait()
+            self._publish_feedback()
+        if rclpy.ok():
+            self.get_logger().error('Arm control process exited.')
+        controller.stop()
 
     async def _control_loop(self) -> None:
         # initialize transport and motors
-        await self._initialize_transport_and_motors()
-        
+        topology = self._load_topology()
+        options = self._controller_options()
+        if self._get_parameter('realtime', False):
+            # Bus loops in their own SCHED_FIFO process, away from rclpy callbacks and the GIL
+            controller = RealtimeArmController(topology, options, RealtimeOptions(
+                priority=self._get_parameter('realtime_priority', 80),
+                cpus=list(self._get_parameter('realtime_cpus', [])),
+                lock_memory=self._get_parameter('realtime_lock_memory', True)
+            ), self.get_logger())
+        else:
+            controller = ArmController(topology, options, self.get_logger(), rclpy.ok, self._publish_feedback)
+            controller.initialize()
+        self._controller = controller
+        self._motors = controller.motors
+        self._bus_index = controller.bus_index
+        self._bus_health = controller.bus_health
+        self._trajectory_executor = controller.trajectory_executor
+
         # ros node initialize
         self._node_initialize()
 
-        # Wait motors online
-        while rclpy.ok():
-            offline_motors = [m.id for m in self._motors.values() if await self._detect_motor(m) == False]
-            if offline_motors:
-                self.get_logger().error(f'Motor {offline_motors} not found.')
-            else:
-                break
-            await asyncio.sleep(1)
-
-        # initialize motors
-        while rclpy.ok():
-            try:
-                states = await asyncio.gather(
-                    asyncio.wait_for(self._transport_left.cycle(
-                        [self._motors[i].controller.make_stop(query=True) for i in range(14, 19)]
-                    ), 0.2),
-                    asyncio.wait_for(self._transport_right.cycle(
-                        [self._motors[i].controller.make_stop(query=True) for i in range(19, 24)]
-                    ), 0.2)
-                )
-            except asyncio.exceptions.TimeoutError:
-                try:
-                    offline_set = set([i for i in range(14, 24)]) - set([i.id for i in chain(*states)])
-                    self.get_logger().warning(f'Moteus send command timeout, offline: {offline_set}.')
-                except NameError:
-                    self.get_logger().warning(f'Moteus send command timeout.')
-                await asyncio.sleep(0.5)
-            else:
-                for state in chain(*states):
-                    self._motors[state.id].initialized = True
-                if all([m.initialized for m in self._motors.values()]):
-                    break
-
-        # control loop
-        timeout_counter = 0
-        while rclpy.ok():
-            try:
-                # Send command
-                if self._teach_mode:
-                    states = await asyncio.gather(
-                        asyncio.wait_for(self._transport_left.cycle(
-                            [self._motors[i].controller.make_stop(query=True) for i in range(14, 19)]
-                        ), 0.2),
-                        asyncio.wait_for(self._transport_right.cycle(
-                            [self._motors[i].controller.make_stop(query=True) for i in range(19, 24)]
-                        ), 0.2)
-                    )
-                else:
-                    # Check joint limit
-                    if any([abs(c.target[0]) > 6.28 for c in self._motors.values()]):
-                        self.get_logger().error(f'Some target of arm motors is greater than 6.28, ignored.')
-                        continue
-
-                    states = await asyncio.gather(
-                        asyncio.wait_for(self._transport_left.cycle([
-                                self._motors[i].controller.make_position(
-                                    position=((-self._motors[i].target[0] if self._motors[i].reverse else self._motors[i].target[0]) + self._motors[i].offset) / (2 * np.pi),
-                                    velocity=0.0,
-                                    maximum_torque=8.0,
-                                    query=True
-                                )
-                                for i in range(14, 19)
-                            ]
-                        ), 0.2),
-                        asyncio.wait_for(self._transport_right.cycle([
-                                self._motors[i].controller.make_position(
-                                    position=((-self._motors[i].target[0] if self._motors[i].reverse else self._motors[i].target[0]) + self._motors[i].offset) / (2 * np.pi),
-                                    velocity=0.0,
-                                    maximum_torque=8.0,
-                                    query=True
-                                )
-                                for i in range(19, 24)
-                            ]
-                        ), 0.2)
-                    )
-            except asyncio.exceptions.TimeoutError:
-                timeout_counter += 1
-                self.get_logger().warning(f'Moteus send command timeout {timeout_counter}.')
-                if timeout_counter > 10:
-                    self.get_logger().error('Moteus timeout too many times, exit.')
-                    break
-            else:
-                timeout_counter = 0
-                for state in chain(*states):
-                    # mapping motor position
-                    position = state.values[moteus.Register.POSITION] * 2 * np.pi - self._motors[state.id].offset
-                    if self._motors[state.id].reverse:
-                        position = -position
-                    
-                    # update feedback
-                    self._motors[state.id].feedback[0] = position
-                    self._motors[state.id].feedback[1] = state.values[moteus.Register.VELOCITY] * 2 * np.pi
-                    
-                    # publish feedback
-                    self._motor_feedback_publisher.publish(
-                        MotorFeedback(
-                            stamp=self.get_clock().now().to_msg(),
-                            id=state.id,
-                            position=self._motors[state.id].feedback[0],
-                            velocity=self._motors[state.id].feedback[1],
-                            torque=state.values[moteus.Register.TORQUE]
-                        )
-                    )
-
-        # Stop motors
-        await self._transport_left.cycle(
-            [self._motors[i].controller.make_stop() for i in range(14, 19)]
-        ),
-        await self._transport_right.cycle(
-            [self._motors[i].controller.make_stop() for i in range(19, 24)]
-        )
+        if isinstance(controller, RealtimeArmController):
+            await self._publish_feedback_loop(controller)
+        else:
+            await controller.run()
 
 
 def main(args=None):
     rclpy.init(args=args)
     humanoid_arm_node = HumanoidArmNode()
-    rclpy.spin(humanoid_arm_node)
+    executor = MultiThreadedExecutor()
+    executor.add_node(humanoid_arm_node)
+    executor.spin()
 
 
 if __name__ == '__main__':
@@ -1,81 +1,425 @@
+import copy
 import numpy as np
 
 
-class SingleMINCOTrajectory:
-    def __init__(self, X, T) -> None:
-        self.T = T
-        self.C = self.calculate(len(T), X, T)
-
-    def calculate(self, n, X, T):
-        A = np.zeros((6 * n, 6 * n))
-        b = np.zeros((6 * n, 1))
-        for i in range(n):
-            A[i, 6 * i] = 1
-            b[i, 0] = X[i]
-        for i in range(n):
-            for j in range(6):
-                A[n + i, 6 * i + j] = np.power(T[i], j)
-            b[n + i, 0] = X[i + 1]
-        for i in range(0, n - 1):
-            for j in range(5):
-                A[2 * n + i, 6 * i + j + 1] = np.power(T[i], j) * (j + 1)
-            A[2 * n + i, 6 * (i + 1) + 1] = -1
-        for i in range(0, n - 1):
-            for j in range(4):
-                A[3 * n + i - 1, 6 * i + j + 2] = np.power(T[i], j) * (j + 1) * (j + 2)
-            A[3 * n + i - 1, 6 * (i + 1) + 2] = -2
-        for i in range(0, n - 1):
-            for j in range(3):
-                A[4 * n + i - 2, 6 * i + j + 3] = np.power(T[i], j) * (j + 1) * (j + 2) * (j + 3)
-            A[4 * n + i - 2, 6 * (i + 1) + 3] = -6
-        for i in range(0, n - 1):
-            for j in range(2):
-                A[5 * n + i - 3, 6 * i + j + 4] = np.power(T[i], j) * (j + 1) * (j + 2) * (j + 3) * (j + 4)
-            A[5 * n + i - 3, 6 * (i + 1) + 4] = -24
-        A[6 * n - 4, 1] = 1
-        A[6 * n - 3, 2] = 2
-        for j in range(5):
-            A[6 * n - 2, 6 * (n - 1) + j + 1] = np.power(T[n - 1], j) * (j + 1)
-        for j in range(4):
-            A[6 * n - 1, 6 * (n - 1) + j + 2] = np.power(T[n - 1], j) * (j + 1) * (j + 2)
-
-        return np.linalg.pinv(A) @ b
-
-    def plan(self, t):
-        i = 0
-        while i < len(self.T) - 1:
-            if t - self.T[:i].sum() < self.T[i]:
-                break
-            i += 1
-        tp = t - self.T[:i].sum()
-        r = np.zeros((3, 1))
-        for j in range(3):
-            r[j, 0] = np.sum([self.C[6 * i + j + k, 0] * np.power(tp, k) * (1 if j == 0 else np.prod([k + l + 1 for l in range(j)])) for k in range(6 - j)], axis=0)
-        return r
+class BandedSystem:
+    def __init__(self, n: int, p: int, q: int) -> None:
+        """Square banded linear system, solved by LU factorization without pivoting.
+
+        Args:
+            n (int): dimension of the matrix
+            p (int): lower bandwidth
+            q (int): upper bandwidth
+        """
+        self.n = n
+        self.p = p
+        self.q = q
+        # Row i stores the columns i - p to i + q.
+        self.data = np.zeros((n, p + q + 1))
+
+    def __getitem__(self, index):
+        i, j = index
+        return self.data[i, j - i + self.p]
+
+    def __setitem__(self, index, value) -> None:
+        i, j = index
+        self.data[i, j - i + self.p] = value
+
+    def factorize(self) -> None:
+        """In-place LU factorization, O(n * p * q)."""
+        n, p, q, d = self.n, self.p, self.q, self.data
+        for k in range(n):
+            j_max = min(k + q, n - 1)
+            for i in range(k + 1, min(k + p, n - 1) + 1):
+                if d[i, k - i + p] != 0.0:
+                    d[i, k - i + p] /= d[k, p]
+                    d[i, k - i + p + 1:j_max - i + p + 1] -= d[i, k - i + p] * d[k, p + 1:j_max - k + p + 1]
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """Solve the factorized system in place.
+
+        Args:
+            b (np.ndarray): n x k matrix, every column is a right-hand side.
+
+        Returns:
+            np.ndarray: b overwritten by the solution.
+        """
+        n, p, q, d = self.n, self.p, self.q, self.data
+        for j in range(n - 1):
+            i_max = min(j + p, n - 1)
+            # L[j + r, j] for r = 1 .. p
+            lower = np.diagonal(d[j + 1:i_max + 1, p - 1::-1])
+            b[j + 1:i_max + 1] -= lower[:, None] * b[j]
+        for j in range(n - 1, -1, -1):
+            b[j] /= d[j, p]
+            i_min = max(0, j - q)
+            # U[j - r, j] for r = 1 .. q
+            upper = np.diagonal(d[i_min:j][::-1, p + 1:])
+            b[i_min:j] -= upper[::-1, None] * b[j]
+        return b
+
+
+def _least_squares_waypoints(ts: np.ndarray, positions: np.ndarray, knots: np.ndarray) -> np.ndarray:
+    """Waypoints at the knots of the minco trajectory closest to the samples in the least squares sense.
+
+    A minco trajectory that starts and ends at rest is the C4 quintic spline through its waypoints,
+    so the fit is done in the local clamped B-spline basis of that spline, where the normal
+    equations are banded and cost O(k) instead of O(k * n^2) with the dense minco basis.
+
+    Args:
+        ts (k,) sample times, covering knots[0] to knots[-1]
+        positions (m, k) sampled positions
+        knots (n + 1,) increasing waypoint times
+
+    Returns:
+        np.ndarray: (m, n + 1) waypoints.
+    """
+    n = len(knots) - 1
+    t = np.concatenate((np.full(5, knots[0]), knots, np.full(5, knots[-1])))
+
+    def basis(x):
+        # Cox de Boor recursion, N[:, r] belongs to control point span - 5 + r
+        span = np.clip(np.searchsorted(t, x, side='right') - 1, 5, n + 4)
+        N = np.zeros((len(x), 6))
+        N[:, 0] = 1.0
+        left = np.zeros((len(x), 6))
+        right = np.zeros((len(x), 6))
+        for j in range(1, 6):
+            left[:, j] = x - t[span + 1 - j]
+            right[:, j] = t[span + j] - x
+            saved = 0.0
+            for r in range(j):
+                temp = N[:, r] / (right[:, r + 1] + left[:, j - r])
+                N[:, r] = saved + right[:, r + 1] * temp
+                saved = left[:, j - r] * temp
+            N[:, j] = saved
+        # Zero velocity and acceleration at both ends tie the first and last three control points together
+        control = np.clip(span[:, None] - 5 + np.arange(6) - 2, 0, n)
+        control[span[:, None] - 5 + np.arange(6) > n + 1] = n
+        return control, N
+
+    control, N = basis(ts)
+    A = BandedSystem(n + 1, 5, 5)
+    for a in range(6):
+        for b in range(6):
+            np.add.at(A.data, (control[:, a], control[:, b] - control[:, a] + 5), N[:, a] * N[:, b])
+    rhs = np.zeros((n + 1, positions.shape[0]))
+    for a in range(6):
+        np.add.at(rhs, control[:, a], N[:, a, None] * positions.T)
+    A.factorize()
+    c = A.solve(rhs)
+    control, N = basis(knots)
+    return np.einsum('kr,krm->mk', N, c[control])
 
 
 class MINCOTrajectory:
-    def __init__(self, X, T) -> None:
+    def __init__(self, X, T, v0=None, a0=None) -> None:
         """Generate minco trajectories.
 
         Args:
             X (m, n + 1)
             T (n,)
+            v0 (m,) initial velocity, zero if None
+            a0 (m,) initial acceleration, zero if None
             where m is the number of joints and n is the number of waypoints.
         """
-        self.minco_trajectories = [SingleMINCOTrajectory(X[i, :], T) for i in range(X.shape[0])]
-    
-    def plan(self, t: float) -> np.ndarray:
+        self.X = np.asarray(X, dtype=float)
+        self.T = np.asarray(T, dtype=float)
+        self.coefficients = self.calculate(self.X, self.T, v0, a0)
+        # Start time of every segment, the last element is t_final.
+        self._times = np.concatenate(([0.0], np.cumsum(self.T)))
+        self.duration = self._times[-1]
+        self._update_horner()
+
+    def _update_horner(self) -> None:
+        # (n, 6, 3, m) tensor, _horner[i, j, k] is the t^j term of the k-th derivative of segment i.
+        n, _, m = self.coefficients.shape
+        self._horner = np.zeros((n, 6, 3, m))
+        self._horner[:, :, 0] = self.coefficients
+        self._horner[:, :5, 1] = self.coefficients[:, 1:] * np.arange(1, 6)[:, None]
+        self._horner[:, :4, 2] = self.coefficients[:, 2:] * (np.arange(2, 6) * np.arange(1, 5))[:, None]
+
+    def anchored(self, start: np.ndarray) -> 'MINCOTrajectory':
+        """Copy of the trajectory that starts at the given state instead of the planned one.
+
+        The difference is blended out by a quintic over the first segment, so the copy matches
+        the trajectory from the first waypoint on, e.g. to reuse a trajectory planned from a
+        nearby start state.
+
+        Args:
+            start (np.ndarray): 3xm position, velocity and acceleration at t = 0.
+
+        Returns:
+            MINCOTrajectory: the anchored copy, the trajectory itself is unchanged.
+        """
+        traj = copy.copy(self)
+        traj.X = self.X.copy()
+        traj.X[:, 0] = start[0]
+        traj.coefficients = self.coefficients.copy()
+        traj.coefficients[0] += FifthOrderTrajectory(start - self.plan(0.0), np.zeros_like(start), self.T[0]).coefficients
+        traj._update_horner()
+        return traj
+
+    @classmethod
+    def time_optimal(cls, X, max_velocity, max_acceleration, max_torque=None, inertia=None, v0=None, a0=None, min_duration: float = 0.05, iterations: int = 20, samples: int = 64) -> 'MINCOTrajectory':
+        """Generate minco trajectories with the fastest feasible durations.
+
+        Every segment duration is rescaled by its own peak velocity and acceleration ratio
+        until all segments touch the joint limits. The result and the initial guess are then
+        both scaled uniformly against a dense sample, including the initial state, and the
+        shorter one is returned, so no limit is exceeded. The torque limit is applied through the
+        acceleration, tau = inertia * a, gravity and coupling between joints are ignored.
+
+        Args:
+            X (m, n + 1)
+            max_velocity (m,) or scalar, rad/s
+            max_acceleration (m,) or scalar, rad/s^2
+            max_torque (m,) or scalar, Nm
+            inertia (m,) or scalar, kg*m^2
+            v0 (m,) initial velocity, zero if None
+            a0 (m,) initial acceleration, zero if None
+            where m is the number of joints and n is the number of waypoints.
+        """
+        X = np.asarray(X, dtype=float)
+        m = X.shape[0]
+        v_max = np.broadcast_to(np.asarray(max_velocity, dtype=float), (m,))
+        a_max = np.broadcast_to(np.asarray(max_acceleration, dtype=float), (m,))
+        if max_torque is not None and inertia is not None:
+            # Zero inertia disables the torque limit
+            with np.errstate(divide='ignore'):
+                a_max = np.minimum(a_max, np.asarray(max_torque, dtype=float) / np.asarray(inertia, dtype=float))
+
+        # Initial guess from the rest to rest quintic, peak v = 1.875 d / T and peak a = 5.774 d / T^2
+        d = np.abs(np.diff(X, axis=1))
+        T = np.max(np.maximum(1.875 * d / v_max[:, None], np.sqrt(5.774 * d / a_max[:, None])), axis=0)
+        T = np.maximum(T, min_duration)
+        T_uniform = T
+        for _ in range(iterations):
+            ratio = cls(X, T, v0, a0).limit_ratio(v_max, a_max, samples)
+            if np.all(np.abs(ratio - 1.0) < 0.01):
+                break
+            T = np.maximum(T * ratio, min_duration)
+
+        # The per segment heuristic is not always faster than scaling the initial guess uniformly
+        candidates = [
+            cls._scale_to_limits(X, durations, v0, a0, v_max, a_max, min_duration, iterations, 4 * samples)
+            for durations in (T, T_uniform)
+        ]
+        return min(candidates, key=lambda traj: traj.duration)
+
+    @classmethod
+    def _scale_to_limits(cls, X, T, v0, a0, v_max, a_max, min_duration: float, iterations: int, samples: int) -> 'MINCOTrajectory':
+        """Scale all durations uniformly until the trajectory touches the limits without exceeding them."""
+        # An initial state beyond the limits can not be fixed by the durations
+        m = X.shape[0]
+        start = np.maximum(
+            np.abs(np.zeros(m) if v0 is None else np.asarray(v0, dtype=float)) / v_max,
+            np.sqrt(np.abs(np.zeros(m) if a0 is None else np.asarray(a0, dtype=float)) / a_max)
+        )
+        limit = max(1.0, start.max())
+        feasible = None
+        traj = None
+        for _ in range(2 * iterations):
+            traj = cls(X, T, v0, a0)
+            scale = traj.limit_ratio(v_max, a_max, samples).max() / limit
+            if scale <= 1.0 and (feasible is None or traj.duration < feasible.duration):
+                feasible = traj
+            if 0.995 <= scale <= 1.0 or (scale < 1.0 and np.all(T <= min_duration)):
+                break
+            # Stretch a little more than needed so the next check passes
+            T = np.maximum(T * (scale * 1.001 if scale > 1.0 else scale), min_duration)
+        return traj if feasible is None else feasible
+
+    @classmethod
+    def fit(cls, ts, positions, tolerance: float = 0.01, min_duration: float = 0.05, max_waypoints: int = 200) -> 'MINCOTrajectory':
+        """Fit a minco trajectory to sampled positions with as few waypoints as the tolerance allows.
+
+        Waypoint times start at the first and last sample, and the waypoints are the least squares
+        fit of all samples. Every segment with a sample further than tolerance from the trajectory
+        is split in the middle, until all samples are within tolerance or no segment can be split.
+        The trajectory starts and ends at rest.
+
+        Args:
+            ts (k,) increasing sample times, s
+            positions (m, k) sampled positions, rad
+            tolerance: maximum position error, rad
+            min_duration: shortest segment, s
+            max_waypoints: maximum number of waypoints
+            where m is the number of joints and k is the number of samples.
+
+        Returns:
+            MINCOTrajectory: trajectory starting at ts[0], with the maximum error in max_error.
+        """
+        ts = np.asarray(ts, dtype=float) - ts[0]
+        positions = np.asarray(positions, dtype=float)
+        waypoints = np.array([0, len(ts) - 1])
+        while True:
+            # Least squares waypoints average out sensor noise
+            T = np.diff(ts[waypoints])
+            traj = cls(_least_squares_waypoints(ts, positions, ts[waypoints]), T)
+            error = np.abs(traj.plan_many(ts)[:, 0] - positions.T).max(axis=1)
+            split = []
+            for i, j in zip(waypoints[:-1], waypoints[1:]):
+                # Only samples at least min_duration away from both ends may split the segment
+                inner = np.flatnonzero((ts[i + 1:j] - ts[i] >= min_duration) & (ts[j] - ts[i + 1:j] >= min_duration)) + i + 1
+                if len(inner) and (worst := error[i:j + 1].max()) > tolerance:
+                    # Splitting in the middle keeps the knots apart, splitting at the worst sample clusters them around noise
+                    split.append((worst, inner[np.argmin(np.abs(ts[inner] - (ts[i] + ts[j]) / 2))]))
+            if not split or len(waypoints) >= max_waypoints:
+                traj.max_error = error.max()
+                return traj
+            # Split the worst segments first when the waypoint budget runs out
+            split = sorted(split, reverse=True)[:max_waypoints - len(waypoints)]
+            waypoints = np.union1d(waypoints, [k for _, k in split])
+
+    def limit_ratio(self, max_velocity: np.ndarray, max_acceleration: np.ndarray, samples: int = 64) -> np.ndarray:
+        """Factor each segment has to be stretched by to meet the limits.
+
+        Args:
+            max_velocity (np.ndarray): (m,) velocity limits.
+            max_acceleration (np.ndarray): (m,) acceleration limits.
+            samples (int): number of samples per segment.
+
+        Returns:
+            np.ndarray: (n,) ratios, greater than 1 if the segment violates a limit.
+        """
+        ts = self._times[:-1, None] + self.T[:, None] * np.linspace(0.0, 1.0, samples)
+        p = self.plan_many(ts.ravel()).reshape(len(self.T), samples, 3, -1)
+        ratio = np.maximum(np.abs(p[:, :, 1]) / max_velocity, np.sqrt(np.abs(p[:, :, 2]) / max_acceleration))
+        return ratio.max(axis=(1, 2))
+
+    @staticmethod
+    def calculate(X: np.ndarray, T: np.ndarray, v0: np.ndarray = None, a0: np.ndarray = None) -> np.ndarray:
+        """Solve the minimum jerk coefficients of all joints at once.
+
+        The constraint matrix only depends on T, so it is factorized once and every
+        joint is solved as a column of the right-hand side, in O(n) time.
+
+        Args:
+            X (np.ndarray): (m, n + 1) waypoints.
+            T (np.ndarray): (n,) durations.
+            v0 (np.ndarray, optional): (m,) initial velocity.
+            a0 (np.ndarray, optional): (m,) initial acceleration.
+
+        Returns:
+            np.ndarray: (n, 6, m) tensor, coefficients[i, j] is the t^j term of segment i.
+        """
+        n = len(T)
+        T1 = T
+        T2 = T1 * T1
+        T3 = T2 * T1
+        T4 = T2 * T2
+        T5 = T4 * T1
+
+        A = BandedSystem(6 * n, 6, 6)
+        b = np.zeros((6 * n, X.shape[0]))
+
+        # Start position, velocity and acceleration
+        A[0, 0] = 1.0
+        A[1, 1] = 1.0
+        A[2, 2] = 2.0
+        b[0] = X[:, 0]
+        if v0 is not None:
+            b[1] = v0
+        if a0 is not None:
+            b[2] = a0
+
+        for i in range(n - 1):
+            # Jerk and snap continuity
+            A[6 * i + 3, 6 * i + 3] = 6.0
+            A[6 * i + 3, 6 * i + 4] = 24.0 * T1[i]
+            A[6 * i + 3, 6 * i + 5] = 60.0 * T2[i]
+            A[6 * i + 3, 6 * i + 9] = -6.0
+            A[6 * i + 4, 6 * i + 4] = 24.0
+            A[6 * i + 4, 6 * i + 5] = 120.0 * T1[i]
+            A[6 * i + 4, 6 * i + 10] = -24.0
+            # Intermediate waypoint
+            A[6 * i + 5, 6 * i] = 1.0
+            A[6 * i + 5, 6 * i + 1] = T1[i]
+            A[6 * i + 5, 6 * i + 2] = T2[i]
+            A[6 * i + 5, 6 * i + 3] = T3[i]
+            A[6 * i + 5, 6 * i + 4] = T4[i]
+            A[6 * i + 5, 6 * i + 5] = T5[i]
+            b[6 * i + 5] = X[:, i + 1]
+            # Position, velocity and acceleration continuity
+            A[6 * i + 6, 6 * i] = 1.0
+            A[6 * i + 6, 6 * i + 1] = T1[i]
+            A[6 * i + 6, 6 * i + 2] = T2[i]
+            A[6 * i + 6, 6 * i + 3] = T3[i]
+            A[6 * i + 6, 6 * i + 4] = T4[i]
+            A[6 * i + 6, 6 * i + 5] = T5[i]
+            A[6 * i + 6, 6 * i + 6] = -1.0
+            A[6 * i + 7, 6 * i + 1] = 1.0
+            A[6 * i + 7, 6 * i + 2] = 2.0 * T1[i]
+            A[6 * i + 7, 6 * i + 3] = 3.0 * T2[i]
+            A[6 * i + 7, 6 * i + 4] = 4.0 * T3[i]
+            A[6 * i + 7, 6 * i + 5] = 5.0 * T4[i]
+            A[6 * i + 7, 6 * i + 7] = -1.0
+            A[6 * i + 8, 6 * i + 2] = 2.0
+            A[6 * i + 8, 6 * i + 3] = 6.0 * T1[i]
+            A[6 * i + 8, 6 * i + 4] = 12.0 * T2[i]
+            A[6 * i + 8, 6 * i + 5] = 20.0 * T3[i]
+            A[6 * i + 8, 6 * i + 8] = -2.0
+
+        # End position, velocity and acceleration
+        A[6 * n - 3, 6 * n - 6] = 1.0
+        A[6 * n - 3, 6 * n - 5] = T1[n - 1]
+        A[6 * n - 3, 6 * n - 4] = T2[n - 1]
+        A[6 * n - 3, 6 * n - 3] = T3[n - 1]
+        A[6 * n - 3, 6 * n - 2] = T4[n - 1]
+        A[6 * n - 3, 6 * n - 1] = T5[n - 1]
+        A[6 * n - 2, 6 * n - 5] = 1.0
+        A[6 * n - 2, 6 * n - 4] = 2.0 * T1[n - 1]
+        A[6 * n - 2, 6 * n - 3] = 3.0 * T2[n - 1]
+        A[6 * n - 2, 6 * n - 2] = 4.0 * T3[n - 1]
+        A[6 * n - 2, 6 * n - 1] = 5.0 * T4[n - 1]
+        A[6 * n - 1, 6 * n - 4] = 2.0
+        A[6 * n - 1, 6 * n - 3] = 6.0 * T1[n - 1]
+        A[6 * n - 1, 6 * n - 2] = 12.0 * T2[n - 1]
+        A[6 * n - 1, 6 * n - 1] = 20.0 * T3[n - 1]
+        b[6 * n - 3] = X[:, n]
+
+        A.factorize()
+        return A.solve(b).reshape(n, 6, -1)
+
+    def plan(self, t: float, out: np.ndarray = None) -> np.ndarray:
         """Plan trajectories.
 
         Args:
             t (float): Time between 0 and t_final.
+            out (np.ndarray, optional): 3xn buffer to write the result into.
 
         Returns:
             np.ndarray: 3xn matrix, the rows of the matrix are position, velocity and acceleration.
         """
-        plans = [self.minco_trajectories[i].plan(t) for i in range(len(self.minco_trajectories))]
-        return np.hstack(plans)
+        i = min(max(np.searchsorted(self._times, t, side='right') - 1, 0), len(self.T) - 1)
+        tp = t - self._times[i]
+        h = self._horner[i]
+        if out is None:
+            out = np.empty(h.shape[1:])
+        np.copyto(out, h[5])
+        for j in range(4, -1, -1):
+            out *= tp
+            out += h[j]
+        return out
+
+    def plan_many(self, ts: np.ndarray) -> np.ndarray:
+        """Plan trajectories at many timestamps in one pass.
+
+        Args:
+            ts (np.ndarray): (k,) times between 0 and t_final.
+
+        Returns:
+            np.ndarray: kx3xn tensor, out[i] is the result of plan(ts[i]).
+        """
+        ts = np.asarray(ts, dtype=float)
+        i = np.clip(np.searchsorted(self._times, ts, side='right') - 1, 0, len(self.T) - 1)
+        tp = (ts - self._times[i])[:, None, None]
+        out = self._horner[i, 5]
+        for j in range(4, -1, -1):
+            out *= tp
+            out += self._horner[i, j]
+        return out
 
 
 class FifthOrderTrajectory:
@@ -120,12 +464,14 @@ class FifthOrderTrajectory:
             ]
         )
         self.coefficients = inv_a @ np.vstack((st, ed))
+        self.duration = dt
 
-    def plan(self, t: float) -> np.ndarray:
+    def plan(self, t: float, out: np.ndarray = None) -> np.ndarray:
         """Plan trajectories.
 
         Args:
             t (float): Time between 0 and dt.
+            out (np.ndarray, optional): 3xn buffer to write the result into.
 
         Returns:
             np.ndarray: 3xn matrix, the rows of the matrix are position, velocity and acceleration.
@@ -136,4 +482,20 @@ class FifthOrderTrajectory:
             [0, 1, 2 * ts[1], 3 * ts[2], 4 * ts[3], 5 * ts[4]],
             [0, 0, 2, 6 * ts[1], 12 * ts[2], 20 * ts[3]],
         ])
+        return np.matmul(t_matrix, self.coefficients, out=out)
+
+    def plan_many(self, ts: np.ndarray) -> np.ndarray:
+        """Plan trajectories at many timestamps in one pass.
+
+        Args:
+            ts (np.ndarray): (k,) times between 0 and dt.
+
+        Returns:
+            np.ndarray: kx3xn tensor, out[i] is the result of plan(ts[i]).
+        """
+        ts = np.power(np.asarray(ts, dtype=float)[:, None], np.arange(6))
+        t_matrix = np.zeros((ts.shape[0], 3, 6))
+        t_matrix[:, 0] = ts
+        t_matrix[:, 1, 1:] = ts[:, :5] * np.arange(1, 6)
+        t_matrix[:, 2, 2:] = ts[:, :4] * np.array([2, 6, 12, 20])
         return t_matrix @ self.coefficients
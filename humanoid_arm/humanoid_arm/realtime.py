@@ -0,0 +1,305 @@
+import asyncio
+import ctypes
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import List
+from .arm_controller import ArmController, BusHealth, ControllerOptions, MotorArrayDataClass
+from .scheduler import TrackingError
+from .topology import ArmTopology
+from .trajectory_executor import TrajectoryGoal
+
+_MCL_CURRENT = 1
+_MCL_FUTURE = 2
+
+
+@dataclass
+class RealtimeOptions:
+    priority: int = 80                              # SCHED_FIFO priority, 0 to keep the default scheduler
+    cpus: List[int] = field(default_factory=list)   # CPU affinity, empty to keep the inherited one
+    lock_memory: bool = True                        # mlockall, so page faults do not stall the loop
+    health_period: float = 0.5                      # period of the bus health reports to the node (s)
+
+
+class SharedArmState:
+    # Arrays shared between the node and the control process, (name, rows, dtype), rows of n values
+    LAYOUT = [
+        ('target', 3, np.float64),
+        ('feedback', 3, np.float64),
+        ('offset', 1, np.float64),
+        ('temperature', 1, np.float64),
+        ('fault', 1, np.int64),
+        ('abs_position', 1, np.float64),
+        ('initialized', 1, np.bool_),
+    ]
+
+    def __init__(self, n: int, name: str = None) -> None:
+        """Motor arrays in shared memory, creates the block if no name is given."""
+        size = sum(rows * n * np.dtype(dtype).itemsize for _, rows, dtype in self.LAYOUT) + 1
+        self._owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        self.arrays = {}
+        offset = 0
+        for key, rows, dtype in self.LAYOUT:
+            shape = (rows, n) if rows > 1 else (n,)
+            self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += rows * n * np.dtype(dtype).itemsize
+        self.flags = np.ndarray((1,), dtype=np.bool_, buffer=self.shm.buf, offset=offset)
+
+    def attach(self, motors: MotorArrayDataClass, controller=None) -> None:
+        """Let the motor arrays (and the teach mode flag of the controller) live in shared memory."""
+        if self._owner:
+            self.arrays['offset'][:] = motors.offset
+            self.arrays['temperature'][:] = np.nan
+            self.arrays['abs_position'][:] = np.nan
+            self.flags[0] = True
+        for key, array in self.arrays.items():
+            setattr(motors, key, array)
+        if controller is not None:
+            controller._flags = self.flags
+
+    def close(self) -> None:
+        self.arrays.clear()
+        self.flags = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Motor arrays still point into the block, it is released with the process
+            pass
+        if self._owner:
+            self.shm.unlink()
+
+
+class ProcessLogger:
+    def __init__(self, name: str) -> None:
+        """Logger of the control process with the throttling interface of the rclpy logger."""
+        self._logger = logging.getLogger(name)
+        self._last = {}
+
+    def _log(self, level: int, message: str, throttle_duration_sec: float = 0.0) -> None:
+        if throttle_duration_sec:
+            now = time.monotonic()
+            # Messages with the same beginning share the throttle, their counters differ
+            key = (level, ' '.join(message.split(' ')[:3]))
+            if now - self._last.get(key, -np.inf) < throttle_duration_sec:
+                return
+            self._last[key] = now
+        self._logger.log(level, message)
+
+    def info(self, message: str, **kwargs) -> None:
+        self._log(logging.INFO, message, **kwargs)
+
+    def warning(self, message: str, **kwargs) -> None:
+        self._log(logging.WARNING, message, **kwargs)
+
+    def error(self, message: str, **kwargs) -> None:
+        self._log(logging.ERROR, message, **kwargs)
+
+
+def configure_realtime(options: RealtimeOptions, logger) -> None:
+    """Apply affinity, SCHED_FIFO and mlockall to the calling process, failures are logged and skipped."""
+    if options.cpus:
+        try:
+            os.sched_setaffinity(0, options.cpus)
+        except OSError as e:
+            logger.warning(f'Failed to set CPU affinity {options.cpus}: {e}.')
+    if options.priority > 0:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(options.priority))
+        except OSError as e:
+            logger.warning(f'Failed to set SCHED_FIFO priority {options.priority}: {e}, see humanoid_base/scripts/setup_scheduler_permission.sh.')
+    if options.lock_memory:
+        libc = ctypes.CDLL('libc.so.6', use_errno=True)
+        if libc.mlockall(_MCL_CURRENT | _MCL_FUTURE) != 0:
+            logger.warning(f'Failed to lock memory: {os.strerror(ctypes.get_errno())}.')
+
+
+async def _serve_commands(controller: ArmController, commands, events, stop_event, health_period: float) -> None:
+    """Apply trajectory and recording commands of the node and report finished goals, recordings and bus health back."""
+    goals = {}
+    next_health = time.monotonic() + health_period
+    while not stop_event.is_set():
+        try:
+            while True:
+                command, goal_id, trajectory, start_time = commands.get_nowait()
+                if command == 'submit':
+                    goals[goal_id] = controller.trajectory_executor.submit(trajectory, start_time)
+                elif command == 'cancel' and goal_id in goals:
+                    controller.trajectory_executor.cancel(goals[goal_id])
+                if command == 'cancel' and trajectory is not None:
+                    goals[-goal_id - 1] = controller.trajectory_executor.submit(trajectory, start_time)
+                # The capacity of a recording takes the place of the goal id
+                if command == 'record':
+                    controller.start_recording(goal_id)
+                elif command == 'stop_recording':
+                    events.put(('recording', controller.stop_recording()))
+        except queue.Empty:
+            pass
+        for goal_id in [i for i, g in goals.items() if g.done()]:
+            events.put(('goal', goal_id, goals.pop(goal_id).succeeded))
+        if time.monotonic() >= next_health:
+            next_health += health_period
+            events.put(('health', [
+                (h.healthy, h.consecutive_timeouts, h.timeouts, h.overruns, h.cycles, h.last_feedback, h.latency.take(), h.jitter.take(), h.tracking.take())
+                for h in controller.bus_health
+            ]))
+        await asyncio.sleep(0.005)
+
+
+def _realtime_main(topology: ArmTopology, options: ControllerOptions, realtime: RealtimeOptions,
+                   shm_name: str, commands, events, stop_event) -> None:
+    logging.basicConfig(level=logging.INFO, format='[humanoid_arm.realtime] %(levelname)s: %(message)s')
+    logger = ProcessLogger('humanoid_arm.realtime')
+    configure_realtime(realtime, logger)
+    controller = ArmController(topology, options, logger, lambda: not stop_event.is_set())
+    controller.initialize()
+    shared = SharedArmState(len(controller.motors), shm_name)
+    shared.attach(controller.motors, controller)
+    try:
+        asyncio.run(controller.run(_serve_commands(controller, commands, events, stop_event, realtime.health_period)))
+    finally:
+        shared.close()
+
+
+class RemoteTrajectoryExecutor:
+    def __init__(self, commands) -> None:
+        """TrajectoryExecutor interface for trajectories executed by the control process."""
+        self._commands = commands
+        self._lock = threading.Lock()
+        self._goals = {}
+        self._active = None
+        self._counter = 0
+
+    def submit(self, trajectory, start_time: float) -> TrajectoryGoal:
+        goal = TrajectoryGoal(trajectory, start_time)
+        with self._lock:
+            if self._active is not None:
+                self._active._finish(False)
+            goal_id = self._counter
+            self._counter += 1
+            self._goals[goal_id] = goal
+            self._active = goal
+            self._commands.put(('submit', goal_id, trajectory, start_time))
+        return goal
+
+    def cancel(self, goal: TrajectoryGoal, trajectory=None, start_time: float = None) -> bool:
+        with self._lock:
+            if self._active is not goal or goal.done():
+                return False
+            goal._finish(False)
+            goal_id = next(i for i, g in self._goals.items() if g is goal)
+            # The braking trajectory is reported as goal -id - 1
+            self._active = None if trajectory is None else TrajectoryGoal(trajectory, start_time)
+            if self._active is not None:
+                self._goals[-goal_id - 1] = self._active
+            self._commands.put(('cancel', goal_id, trajectory, start_time))
+            return True
+
+    def state(self, t: float) -> np.ndarray:
+        with self._lock:
+            goal = self._active
+            if goal is None or goal.done():
+                return None
+            return goal.trajectory.plan(min(max(t - goal.start_time, 0.0), goal.trajectory.duration))
+
+    def _finish(self, goal_id: int, succeeded: bool) -> None:
+        with self._lock:
+            goal = self._goals.pop(goal_id, None)
+            if goal is not None and not goal.done():
+                goal._finish(succeeded)
+            if self._active is goal:
+                self._active = None
+
+
+class RealtimeArmController:
+    def __init__(self, topology: ArmTopology, options: ControllerOptions, realtime: RealtimeOptions, logger) -> None:
+        """Run the bus loops of ArmController in a separate real-time process.
+
+        Targets, feedback, offsets and the teach mode flag are shared memory, trajectories and bus
+        health are exchanged over queues.
+        """
+        self.topology = topology
+        self.options = options
+        self._logger = logger
+        self.motors = MotorArrayDataClass.from_topology(topology)
+        self._shared = SharedArmState(len(self.motors))
+        self._shared.attach(self.motors, self)
+        self.bus_index = [np.flatnonzero(self.motors.bus == b) for b in range(len(topology.buses))]
+        self.bus_health = [
+            BusHealth(name=b.name, timeout=b.timeout, rate=b.rate or options.control_rate, tracking=TrackingError(len(self.motors)))
+            for b in topology.buses
+        ]
+
+        context = multiprocessing.get_context('spawn')
+        self._commands = context.Queue()
+        self._events = context.Queue()
+        self._stop_event = context.Event()
+        self.trajectory_executor = RemoteTrajectoryExecutor(self._commands)
+        self._recordings = queue.Queue()
+        self._process = context.Process(
+            target=_realtime_main,
+            args=(topology, options, realtime, self._shared.shm.name, self._commands, self._events, self._stop_event),
+            name='humanoid_arm_realtime',
+            daemon=True
+        )
+        self._process.start()
+        self._event_thread = threading.Thread(target=self._receive_events, daemon=True)
+        self._event_thread.start()
+        self._logger.info(f'Arm control loop running in process {self._process.pid}.')
+
+    @property
+    def teach_mode(self) -> bool:
+        return bool(self._flags[0])
+
+    @teach_mode.setter
+    def teach_mode(self, value: bool) -> None:
+        self._flags[0] = value
+
+    def start_recording(self, capacity: int) -> None:
+        self._commands.put(('record', capacity, None, None))
+
+    def stop_recording(self, timeout: float = 2.0):
+        """Stop recording, returns timestamps (k,) and feedback (k, 3, n), None if nothing was recorded."""
+        self._commands.put(('stop_recording', 0, None, None))
+        try:
+            return self._recordings.get(timeout=timeout)
+        except queue.Empty:
+            self._logger.error('Arm control process did not return the recording.')
+            return None
+
+    def alive(self) -> bool:
+        return self._process.is_alive()
+
+    def _receive_events(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                event = self._events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if event[0] == 'goal':
+                self.trajectory_executor._finish(event[1], event[2])
+            elif event[0] == 'recording':
+                self._recordings.put(event[1])
+            elif event[0] == 'health':
+                for h, (healthy, consecutive_timeouts, timeouts, overruns, cycles, last_feedback, latency, jitter, tracking) in zip(self.bus_health, event[1]):
+                    h.healthy, h.consecutive_timeouts, h.timeouts, h.overruns, h.cycles, h.last_feedback = \
+                        healthy, consecutive_timeouts, timeouts, overruns, cycles, last_feedback
+                    h.latency.merge(*latency)
+                    h.jitter.merge(*jitter)
+                    h.tracking.merge(*tracking)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop the control process, it stops the motors before exiting."""
+        self._stop_event.set()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._logger.error('Arm control process did not stop, terminate it.')
+            self._process.terminate()
+        self._event_thread.join()
+        self._shared.close()
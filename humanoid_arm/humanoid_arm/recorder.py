@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class Recorder:
+    def __init__(self, n: int, capacity: int) -> None:
+        """Feedback stream of a demonstration, preallocated so recording does not allocate in the control loop.
+
+        Args:
+            n (int): number of motors.
+            capacity (int): maximum number of samples, later samples are dropped.
+        """
+        self.t = np.zeros(capacity)
+        self.feedback = np.zeros((capacity, 3, n), dtype=np.float32)
+        self.count = 0
+        self.dropped = 0
+
+    def add(self, t: float, feedback: np.ndarray) -> None:
+        """Append a sample.
+
+        Args:
+            t (float): time.monotonic() timestamp.
+            feedback (np.ndarray): 3xn position, velocity and torque.
+        """
+        if self.count < len(self.t):
+            self.t[self.count] = t
+            self.feedback[self.count] = feedback
+            self.count += 1
+        else:
+            self.dropped += 1
+
+    def take(self):
+        """Timestamps (k,) and feedback (k, 3, n) of the recorded samples."""
+        return self.t[:self.count].copy(), self.feedback[:self.count].copy()
+
+
+def save_recording(path: str, motor_id: np.ndarray, t: np.ndarray, feedback: np.ndarray) -> None:
+    """Write a recording as float32 feedback and float64 timestamps relative to the first sample."""
+    with open(path, 'wb') as fp:
+        np.savez(fp, motor_id=np.asarray(motor_id, dtype=np.int64), t=t - t[0], feedback=feedback.astype(np.float32))
+
+
+def load_recording(path: str):
+    """motor_id (n,), t (k,) and feedback (k, 3, n) of a saved recording."""
+    with np.load(path) as data:
+        return data['motor_id'], data['t'], data['feedback']
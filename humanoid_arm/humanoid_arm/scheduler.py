@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+import numpy as np
+
+
+class DeadlineScheduler:
+    def __init__(self, rate: float) -> None:
+        """Wake up at fixed deadlines, a late cycle skips the deadlines it missed instead of bursting.
+
+        Args:
+            rate (float): cycle rate (Hz).
+        """
+        self.period = 1.0 / rate
+        self.overruns = 0
+        self._deadline = None
+
+    def reset(self) -> None:
+        """Start over from the next wait, e.g. after a deliberate pause."""
+        self._deadline = None
+
+    async def wait(self) -> float:
+        """Sleep until the next deadline.
+
+        Returns:
+            float: jitter, time.monotonic() of the wake up minus the deadline (s).
+        """
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._deadline += self.period
+            if now > self._deadline:
+                # The last cycle overran its period, restart from the next deadline in the future
+                self.overruns += 1
+                self._deadline += np.ceil((now - self._deadline) / self.period) * self.period
+        await asyncio.sleep(self._deadline - now)
+        return time.monotonic() - self._deadline
+
+
+class AdaptiveTimeout:
+    def __init__(self, initial: float, minimum: float, maximum: float, factor: float = 4.0) -> None:
+        """Timeout that follows the measured round trip, so a missing device costs a few round trips instead of a fixed second.
+
+        Args:
+            initial (float): timeout before the first round trip was measured (s).
+            minimum (float): lower bound of the timeout (s).
+            maximum (float): upper bound of the timeout (s).
+            factor (float): timeout as a multiple of the smoothed round trip.
+        """
+        self._initial = initial
+        self._minimum = minimum
+        self._maximum = maximum
+        self._factor = factor
+        self.round_trip = None
+
+    @property
+    def timeout(self) -> float:
+        if self.round_trip is None:
+            return self._initial
+        return min(max(self._factor * self.round_trip, self._minimum), self._maximum)
+
+    def update(self, round_trip: float) -> None:
+        """Add a measured round trip (s)."""
+        self.round_trip = round_trip if self.round_trip is None else 0.8 * self.round_trip + 0.2 * round_trip
+
+
+class Histogram:
+    # Upper edges of the bins (ms), the last bin counts everything above
+    EDGES = np.array([0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0])
+
+    def __init__(self) -> None:
+        """Histogram of durations, filled by the control loop and read by the diagnostics timer."""
+        self._lock = threading.Lock()
+        self._counts = np.zeros(len(self.EDGES) + 1, dtype=int)
+        self._max = 0.0
+
+    def add(self, value: float) -> None:
+        """Add a duration (s)."""
+        ms = value * 1000
+        with self._lock:
+            self._counts[np.searchsorted(self.EDGES, ms)] += 1
+            self._max = max(self._max, ms)
+
+    def take(self):
+        """Return and reset the bin counts and the maximum (ms)."""
+        with self._lock:
+            counts, self._counts = self._counts, np.zeros_like(self._counts)
+            maximum, self._max = self._max, 0.0
+        return counts, maximum
+
+    def merge(self, counts: np.ndarray, maximum: float) -> None:
+        """Add the bin counts and the maximum (ms) taken from another histogram."""
+        with self._lock:
+            self._counts += counts
+            self._max = max(self._max, maximum)
+
+    @classmethod
+    def percentile(cls, counts: np.ndarray, q: float) -> float:
+        """Upper bin edge (ms) below which q percent of the samples fall, inf if in the last bin."""
+        total = counts.sum()
+        if total == 0:
+            return 0.0
+        i = np.searchsorted(np.cumsum(counts), q / 100 * total)
+        return float(cls.EDGES[i]) if i < len(cls.EDGES) else float('inf')
+
+    @classmethod
+    def labels(cls):
+        return [f'<={e:g}ms' for e in cls.EDGES] + [f'>{cls.EDGES[-1]:g}ms']
+
+
+class TrackingError:
+    def __init__(self, n: int) -> None:
+        """Per joint position tracking error, filled by the control loop and read by the diagnostics timer."""
+        self._lock = threading.Lock()
+        self._n = n
+        self._sum_sq = np.zeros(n)
+        self._count = np.zeros(n, dtype=int)
+        self._max = np.zeros(n)
+
+    def add(self, index: np.ndarray, error: np.ndarray) -> None:
+        """Add the error (rad) of the given joints."""
+        with self._lock:
+            self._sum_sq[index] += error * error
+            self._count[index] += 1
+            self._max[index] = np.maximum(self._max[index], np.abs(error))
+
+    def take(self):
+        """Return and reset the sum of squares, the sample count and the maximum (rad) of every joint."""
+        with self._lock:
+            taken = (self._sum_sq, self._count, self._max)
+            self._sum_sq = np.zeros(self._n)
+            self._count = np.zeros(self._n, dtype=int)
+            self._max = np.zeros(self._n)
+        return taken
+
+    def merge(self, sum_sq: np.ndarray, count: np.ndarray, maximum: np.ndarray) -> None:
+        """Add the values taken from another tracker."""
+        with self._lock:
+            self._sum_sq += sum_sq
+            self._count += count
+            self._max = np.maximum(self._max, maximum)
+
+    @staticmethod
+    def rms(sum_sq: np.ndarray, count: np.ndarray) -> np.ndarray:
+        """RMS error (rad) of every joint, NaN for joints without samples."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(sum_sq / count)
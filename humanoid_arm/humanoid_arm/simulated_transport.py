@@ -0,0 +1,191 @@
+import asyncio
+import random
+import struct
+import time
+import numpy as np
+from dataclasses import dataclass
+
+
+# Multiplex protocol, see the moteus reference manual
+_WRITE_BASE = 0x00
+_READ_BASE = 0x10
+_NOP = 0x50
+_TYPE_SIZE = [1, 2, 4, 4]                           # int8, int16, int32, f32
+_TYPE_FORMAT = ['<b', '<h', '<i', '<f']
+_TYPE_NAN = [-(1 << 7), -(1 << 15), -(1 << 31)]
+
+# Scale of the integer encodings (int8, int16, int32) of the command registers used by the arm
+_REGISTER_SCALE = {
+    0x020: (0.01, 0.0001, 0.00001),                 # position (revolution)
+    0x021: (0.1, 0.00025, 0.00001),                 # velocity (revolution/s)
+    0x022: (0.5, 0.01, 0.001),                      # feedforward torque (Nm)
+    0x025: (0.5, 0.01, 0.001),                      # maximum torque (Nm)
+}
+
+_MODE_STOPPED = 0
+_MODE_POSITION = 10
+
+
+@dataclass
+class _Frame:
+    arbitration_id: int
+    data: bytes
+    bus: int = 1
+    channel: object = None
+
+
+def _read_varuint(data: bytes, offset: int):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, offset
+
+
+def decode_writes(data: bytes) -> dict:
+    """Register writes of a moteus command frame, reads and unknown registers are skipped.
+
+    Returns:
+        dict: register to value, command registers in revolution, revolution/s and Nm.
+    """
+    writes = {}
+    offset = 0
+    while offset < len(data):
+        cmd = data[offset]
+        offset += 1
+        upper = cmd & 0xf0
+        if upper == _NOP:
+            continue
+        if upper not in (_WRITE_BASE, _READ_BASE):
+            break
+        kind = (cmd >> 2) & 0x03
+        count = cmd & 0x03
+        if count == 0:
+            count, offset = _read_varuint(data, offset)
+        register, offset = _read_varuint(data, offset)
+        if upper == _READ_BASE:
+            continue
+        for r in range(register, register + count):
+            raw, = struct.unpack_from(_TYPE_FORMAT[kind], data, offset)
+            offset += _TYPE_SIZE[kind]
+            if kind == 3:
+                writes[r] = raw
+            elif r in _REGISTER_SCALE:
+                writes[r] = np.nan if raw == _TYPE_NAN[kind] else raw * _REGISTER_SCALE[r][kind]
+            else:
+                writes[r] = raw
+    return writes
+
+
+class _SimulatedMotor:
+    def __init__(self, position: float) -> None:
+        self.mode = _MODE_STOPPED
+        self.position = position
+        self.velocity = 0.0
+        self.torque = 0.0
+        self.target = position
+        self.target_velocity = 0.0
+        self.maximum_torque = np.inf
+        self.stamp = time.monotonic()
+
+    def step(self, now: float, time_constant: float, stiffness: float) -> None:
+        """First order response to the position target, a stopped motor holds still.
+
+        Like moteus, the target advances at the commanded velocity between commands, and the
+        commanded velocity is fed forward so only the position error decays with the time constant.
+        """
+        dt = now - self.stamp
+        self.stamp = now
+        if dt <= 0.0:
+            return
+        if self.mode == _MODE_POSITION and np.isfinite(self.target):
+            error = self.target - self.position
+            self.torque = float(np.clip(stiffness * 2 * np.pi * error, -self.maximum_torque, self.maximum_torque))
+            self.target += self.target_velocity * dt
+            position = self.target - error * np.exp(-dt / time_constant)
+            self.velocity = (position - self.position) / dt
+            self.position = position
+        else:
+            self.velocity = 0.0
+            self.torque = 0.0
+
+    def reply(self) -> bytes:
+        return (
+            struct.pack('<BBb', 0x21, 0x00, self.mode) +
+            struct.pack('<BBfff', 0x2f, 0x01, self.position, self.velocity, self.torque) +
+            struct.pack('<BBf', 0x2d, 0x06, self.position % 1.0) +
+            struct.pack('<BBff', 0x2e, 0x0d, 24.0, 30.0) +
+            struct.pack('<BBb', 0x21, 0x0f, 0)
+        )
+
+
+class SimulatedTransport:
+    def __init__(self, ids=None, latency: float = 0.001, jitter: float = 0.0002, drop_rate: float = 0.0,
+                 time_constant: float = 0.05, stiffness: float = 10.0, initial_position: float = 0.0) -> None:
+        """Stand-in for moteus.Fdcanusb, answers cycle() and write() from simulated motors.
+
+        Args:
+            ids (optional): motor ids on this bus, None to answer every id.
+            latency (float): mean round trip of one cycle (s).
+            jitter (float): standard deviation of the round trip (s).
+            drop_rate (float): probability that a reply is lost.
+            time_constant (float): time constant of the first order position response (s).
+            stiffness (float): torque per position error (Nm/rad), limited by the commanded maximum torque.
+            initial_position (float): motor position at start (revolution).
+        """
+        self._ids = None if ids is None else set(int(i) for i in ids)
+        self._latency = latency
+        self._jitter = jitter
+        self._drop_rate = drop_rate
+        self._time_constant = time_constant
+        self._stiffness = stiffness
+        self._initial_position = initial_position
+        self._motors = {}
+        self._received = None
+
+    def _motor(self, motor_id: int) -> _SimulatedMotor:
+        if motor_id not in self._motors:
+            self._motors[motor_id] = _SimulatedMotor(self._initial_position)
+        return self._motors[motor_id]
+
+    def _answer(self, command, now: float):
+        """Apply one command to its simulated motor, returns the reply frame or None."""
+        motor_id = int(getattr(command.destination, 'can_id', command.destination))
+        if self._ids is not None and motor_id not in self._ids:
+            return None
+        motor = self._motor(motor_id)
+        motor.step(now, self._time_constant, self._stiffness)
+        writes = decode_writes(command.data)
+        if 0x000 in writes:
+            motor.mode = writes[0x000]
+        if 0x020 in writes:
+            motor.target = writes[0x020]
+            motor.target_velocity = writes[0x021] if np.isfinite(writes.get(0x021, np.nan)) else 0.0
+        if 0x025 in writes:
+            motor.maximum_torque = abs(writes[0x025]) if np.isfinite(writes[0x025]) else np.inf
+        if command.reply_required and random.random() >= self._drop_rate:
+            return _Frame(arbitration_id=(motor_id << 8) | command.source, data=motor.reply())
+        return None
+
+    async def cycle(self, commands, **kwargs) -> list:
+        now = time.monotonic()
+        replies = [(command, frame) for command in commands if (frame := self._answer(command, now)) is not None]
+        await asyncio.sleep(max(random.gauss(self._latency, self._jitter), 0.0))
+        return [command.parse(frame) for command, frame in replies]
+
+    async def write(self, command) -> None:
+        """Send one command without waiting, its reply is returned by read() after the round trip."""
+        if self._received is None:
+            self._received = asyncio.Queue()
+        if (frame := self._answer(command, time.monotonic())) is not None:
+            asyncio.get_event_loop().call_later(max(random.gauss(self._latency, self._jitter), 0.0), self._received.put_nowait, frame)
+
+    async def read(self):
+        """Wait for the next reply to a written command."""
+        if self._received is None:
+            self._received = asyncio.Queue()
+        return await self._received.get()
@@ -0,0 +1,130 @@
+import os
+import yaml
+import moteus
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+@dataclass
+class BusConfig:
+    name: str
+    device: str = ''                                # fdcanusb serial path, empty to auto detect
+    transport: str = 'fdcanusb'                     # fdcanusb or simulated
+    timeout: float = 0.2                            # cycle timeout (s)
+    rate: float = 0.0                               # control rate (Hz), 0 to use the control_rate parameter
+
+
+@dataclass
+class MotorConfig:
+    id: int
+    bus: str
+    reverse: bool = False
+    offset: float = 0.0                             # joint zero in motor space (rad)
+    maximum_torque: float = 8.0                     # Nm
+    query_resolution: str = 'int16'                 # resolution of the queried position, velocity and torque
+
+
+@dataclass
+class ArmTopology:
+    buses: List[BusConfig]
+    motors: List[MotorConfig]
+
+    def bus_of(self, motor: MotorConfig) -> int:
+        """Index of the bus the motor is connected to."""
+        return [b.name for b in self.buses].index(motor.bus)
+
+    def motors_on(self, bus: int) -> List[MotorConfig]:
+        return [m for m in self.motors if m.bus == self.buses[bus].name]
+
+
+def default_config_path() -> str:
+    from ament_index_python.packages import get_package_share_directory
+    return os.path.join(get_package_share_directory('humanoid_arm'), 'config', 'arm_mapping.yaml')
+
+
+def parse_topology(parameters: Dict[str, object]) -> ArmTopology:
+    """Build the topology from flattened ROS parameters.
+
+    Args:
+        parameters (Dict[str, object]): parameter name to value, e.g. 'buses.left.device' or 'motors.motor_14.bus'.
+
+    Returns:
+        ArmTopology: buses sorted by name, motors sorted by id.
+    """
+    buses = {}
+    motors = {}
+    for name, value in parameters.items():
+        group, _, rest = name.partition('.')
+        key, _, attribute = rest.partition('.')
+        if not attribute:
+            continue
+        if group == 'buses':
+            buses.setdefault(key, {})[attribute] = value
+        elif group == 'motors':
+            motors.setdefault(key, {})[attribute] = value
+    topology = ArmTopology(
+        buses=[BusConfig(name=k, **v) for k, v in sorted(buses.items())],
+        motors=sorted([MotorConfig(id=int(k.split('_')[-1]), **v) for k, v in motors.items()], key=lambda m: m.id)
+    )
+    bus_names = [b.name for b in topology.buses]
+    for m in topology.motors:
+        if m.bus not in bus_names:
+            raise ValueError(f'Motor {m.id} is connected to unknown bus {m.bus}.')
+    return topology
+
+
+def load_topology(path: str = None, node_name: str = 'humanoid_arm') -> ArmTopology:
+    """Load the topology from a ROS parameter file, for tools running without a node."""
+    with open(path or default_config_path()) as fp:
+        config = yaml.safe_load(fp)[node_name]['ros__parameters']
+    parameters = {}
+    for group in ('buses', 'motors'):
+        for key, attributes in config.get(group, {}).items():
+            for attribute, value in attributes.items():
+                parameters[f'{group}.{key}.{attribute}'] = value
+    return parse_topology(parameters)
+
+
+QUERY_RESOLUTIONS = {
+    'int8': moteus.INT8,
+    'int16': moteus.INT16,
+    'int32': moteus.INT32,
+    'f32': moteus.F32,
+}
+
+
+def make_query_resolution(resolution: str, slow: bool = False) -> moteus.QueryResolution:
+    """Query only the registers the arm uses.
+
+    Args:
+        resolution (str): int8, int16, int32 or f32, resolution of position, velocity and torque.
+        slow (bool): also query temperature, fault and absolute position, for the occasional slow query.
+    """
+    if resolution not in QUERY_RESOLUTIONS:
+        raise ValueError(f'Unknown query resolution {resolution}.')
+    qr = moteus.QueryResolution()
+    for name in dir(qr):
+        if not name.startswith('_') and isinstance(getattr(qr, name), int):
+            setattr(qr, name, moteus.IGNORE)
+    qr.position = qr.velocity = qr.torque = QUERY_RESOLUTIONS[resolution]
+    if slow:
+        qr.temperature = moteus.INT8
+        qr.fault = moteus.INT8
+        qr.abs_position = moteus.INT16
+    return qr
+
+
+def make_transport(bus: BusConfig, ids=None, **simulation):
+    """Create the transport of a bus.
+
+    Args:
+        bus (BusConfig): bus configuration.
+        ids (optional): motor ids on the bus, answered by a simulated transport.
+        simulation: keyword arguments of SimulatedTransport.
+    """
+    if bus.transport == 'simulated':
+        from .simulated_transport import SimulatedTransport
+        return SimulatedTransport(ids=ids, **simulation)
+    if bus.transport != 'fdcanusb':
+        raise ValueError(f'Bus {bus.name} has unknown transport {bus.transport}.')
+    return moteus.Fdcanusb(bus.device or None)
@@ -0,0 +1,108 @@
+import threading
+import numpy as np
+
+
+class TrajectoryGoal:
+    def __init__(self, trajectory, start_time: float) -> None:
+        """Trajectory submitted to the executor.
+
+        Args:
+            trajectory: MINCOTrajectory or FifthOrderTrajectory.
+            start_time (float): time.monotonic() of t = 0.
+        """
+        self.trajectory = trajectory
+        self.start_time = start_time
+        self.succeeded = False
+        self._done = threading.Event()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def progress(self, t: float) -> float:
+        """Fraction of the trajectory executed at time.monotonic() timestamp t."""
+        if self.done():
+            return 1.0 if self.succeeded else 0.0
+        return min(max((t - self.start_time) / self.trajectory.duration, 0.0), 1.0)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until the trajectory finished or was preempted.
+
+        Returns:
+            bool: True if the goal is done, succeeded tells whether it was executed to the end.
+        """
+        return self._done.wait(timeout)
+
+    def _finish(self, succeeded: bool) -> None:
+        self.succeeded = succeeded
+        self._done.set()
+
+
+class TrajectoryExecutor:
+    def __init__(self) -> None:
+        """Execute one trajectory at a time, sampled by the control loop every cycle."""
+        self._goal = None
+        self._lock = threading.Lock()
+
+    def submit(self, trajectory, start_time: float) -> TrajectoryGoal:
+        """Replace the active trajectory, the previous one is preempted."""
+        goal = TrajectoryGoal(trajectory, start_time)
+        with self._lock:
+            if self._goal is not None:
+                self._goal._finish(False)
+            self._goal = goal
+        return goal
+
+    def cancel(self, goal: TrajectoryGoal, trajectory=None, start_time: float = None) -> bool:
+        """Cancel the goal if it is still active.
+
+        Args:
+            goal (TrajectoryGoal): goal returned by submit.
+            trajectory (optional): trajectory to continue with, e.g. to brake smoothly.
+            start_time (float, optional): time.monotonic() of t = 0 of the new trajectory.
+
+        Returns:
+            bool: False if the goal was not active any more.
+        """
+        with self._lock:
+            if self._goal is not goal:
+                return False
+            goal._finish(False)
+            self._goal = None if trajectory is None else TrajectoryGoal(trajectory, start_time)
+            return True
+
+    def state(self, t: float) -> np.ndarray:
+        """Commanded state of the active trajectory.
+
+        Args:
+            t (float): time.monotonic() timestamp.
+
+        Returns:
+            np.ndarray: 3xn matrix, the rows of the matrix are position, velocity and acceleration.
+            None if no trajectory is active.
+        """
+        with self._lock:
+            if self._goal is None:
+                return None
+            return self._goal.trajectory.plan(min(max(t - self._goal.start_time, 0.0), self._goal.trajectory.duration))
+
+    def sample(self, t: float, out: np.ndarray) -> bool:
+        """Sample the active trajectory, called once per control cycle.
+
+        Args:
+            t (float): time.monotonic() timestamp of the cycle.
+            out (np.ndarray): 3xn buffer to write the commanded state into.
+
+        Returns:
+            bool: False if no trajectory is active and out is untouched.
+        """
+        with self._lock:
+            goal = self._goal
+            if goal is None:
+                return False
+            tp = max(t - goal.start_time, 0.0)
+            if tp >= goal.trajectory.duration:
+                tp = goal.trajectory.duration
+                self._goal = None
+                goal._finish(True)
+            goal.trajectory.plan(tp, out=out)
+            return True
@@ -12,7 +12,9 @@ setup(
         ('share/ament_index/resource_index/packages',
             ['resource/' + package_name]),
         ('share/' + package_name, ['package.xml']),
-        (os.path.join('share', package_name, 'frames'), glob(os.path.join('frames', '*.json')))
+        (os.path.join('share', package_name, 'frames'), glob(os.path.join('frames', '*.json'))),
+        (os.path.join('share', package_name, 'config'), glob(os.path.join('config', '*.yaml'))),
+        (os.path.join('share', package_name, 'launch'), glob(os.path.join('launch', '*.py')))
     ],
     install_requires=['setuptools'],
     zip_safe=True,
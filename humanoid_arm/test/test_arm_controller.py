@@ -0,0 +1,106 @@
+import asyncio
+import time
+import numpy as np
+from humanoid_arm.arm_controller import ArmController, ControllerOptions, MotorArrayDataClass
+from humanoid_arm.joint_trajectory_planner import FifthOrderTrajectory
+from humanoid_arm.realtime import ProcessLogger
+from humanoid_arm.scheduler import TrackingError
+from humanoid_arm.topology import parse_topology
+
+
+def _controller(done, **options) -> ArmController:
+    topology = parse_topology({
+        'buses.left.transport': 'simulated',
+        'buses.right.transport': 'simulated',
+        'motors.motor_14.bus': 'left',
+        'motors.motor_15.bus': 'left',
+        'motors.motor_19.bus': 'right',
+        'motors.motor_20.bus': 'right',
+    })
+    controller = ArmController(topology, ControllerOptions(**options), ProcessLogger('test'), lambda: not done)
+    controller.initialize()
+    return controller
+
+
+def test_missing_motor_is_found_later():
+    done = []
+    controller = _controller(done, discovery_retry_period=0.05)
+    controller.transports[0]._ids.discard(15)
+    online = []
+
+    async def scenario():
+        await asyncio.sleep(0.2)
+        online.append(controller.motors.initialized.tolist())
+        cycles = controller.bus_health[0].cycles
+        controller.transports[0]._ids.add(15)
+        await asyncio.sleep(0.3)
+        online.append(controller.motors.initialized.tolist())
+        # The missing motor never held back the bus loop
+        online.append(controller.bus_health[0].cycles - cycles)
+        done.append(True)
+
+    st = time.monotonic()
+    asyncio.run(controller.run(scenario()))
+    assert online[0] == [True, False, True, True]
+    assert online[1] == [True, True, True, True]
+    assert online[2] > 30
+    assert time.monotonic() - st < 2.0
+
+
+def _tracking_rms(**options) -> float:
+    done = []
+    controller = _controller(done, **options)
+    controller.teach_mode = False
+    move = FifthOrderTrajectory(np.zeros((3, 4)), np.vstack([np.full(4, 1.0), np.zeros((2, 4))]), 0.5)
+
+    async def scenario():
+        await asyncio.sleep(0.1)
+        for h in controller.bus_health:
+            h.tracking.take()
+        controller.trajectory_executor.submit(move, time.monotonic())
+        await asyncio.sleep(0.5)
+        done.append(True)
+
+    asyncio.run(controller.run(scenario()))
+    sum_sq, count, _ = controller.bus_health[0].tracking.take()
+    return float(np.nanmax(TrackingError.rms(sum_sq, count)))
+
+
+def test_velocity_feedforward_reduces_the_tracking_error():
+    without = _tracking_rms(velocity_feedforward_gain=0.0)
+    with_feedforward = _tracking_rms(velocity_feedforward_gain=1.0)
+    assert with_feedforward < 0.5 * without
+
+
+def _motors() -> MotorArrayDataClass:
+    return MotorArrayDataClass.from_topology(parse_topology({
+        'buses.left.device': '',
+        'motors.motor_14.bus': 'left',
+        'motors.motor_14.offset': 0.2,
+        'motors.motor_15.bus': 'left',
+        'motors.motor_15.reverse': True,
+        'motors.motor_15.offset': -0.1,
+    }))
+
+
+def test_joint_and_motor_space_round_trip():
+    motors = _motors()
+    joint = np.array([0.5, 0.5])
+    motor = motors.joint_to_motor(joint)
+    np.testing.assert_allclose(motor, [0.7 / (2 * np.pi), -0.6 / (2 * np.pi)])
+    motors.update_feedback(np.array([1, 0]), motor[::-1], np.array([0.0, 1.0]), np.array([2.0, 0.0]))
+    np.testing.assert_allclose(motors.feedback, [[0.5, 0.5], [2 * np.pi, 0.0], [0.0, -2.0]])
+
+
+def test_calibration_drift():
+    motors = _motors()
+    offset, abs_reference = motors.offset.copy(), np.array([0.95, 0.3])
+    # The joints moved by 0.4 rad since calibration, the absolute encoders turned with the motors
+    motors.feedback[0] = 0.4
+    motors.abs_position = (abs_reference + motors.reverse * 0.4 / (2 * np.pi)) % 1.0
+    np.testing.assert_allclose(motors.calibration_drift(offset, abs_reference), 0.0, atol=1e-9)
+    # A motor position that slipped by 0.1 rad against its absolute encoder shows up as drift
+    motors.abs_position[0] += 0.1 / (2 * np.pi)
+    np.testing.assert_allclose(motors.calibration_drift(offset, abs_reference), [0.1, 0.0], atol=1e-9)
+    motors.abs_position[1] = np.nan
+    assert np.isnan(motors.calibration_drift(offset, abs_reference)[1])
@@ -0,0 +1,41 @@
+import moteus
+import pytest
+from humanoid_arm.command_template import MotorCommandTemplates, PositionCommandTemplate
+
+
+def _controller(**kwargs) -> moteus.Controller:
+    return moteus.Controller(id=14, query_resolution=moteus.QueryResolution(), **kwargs)
+
+
+@pytest.mark.parametrize('fields', [('position',), ('position', 'velocity'), ('position', 'velocity', 'feedforward_torque')])
+def test_template_encodes_like_make_position(fields):
+    controller = _controller()
+    template = PositionCommandTemplate(controller, fields=fields, maximum_torque=2.5)
+    for values in ([0.0, 0.0, 0.0], [1.25, -3.5, 0.75], [-7.0, 12.0, -0.125]):
+        values = values[:len(fields)]
+        expected = controller.make_position(query=True, maximum_torque=2.5, **dict(zip(fields, values)))
+        assert bytes(template.set(*values).data) == expected.data
+
+
+def test_template_keeps_the_query_override():
+    controller = _controller()
+    slow_query = moteus.QueryResolution()
+    slow_query.temperature = moteus.INT8
+    slow_query.fault = moteus.INT8
+    template = PositionCommandTemplate(controller, query_override=slow_query, fields=('position', 'velocity'))
+    expected = controller.make_position(position=0.5, velocity=-0.25, query=True, query_override=slow_query)
+    assert bytes(template.set(0.5, -0.25).data) == expected.data
+
+
+def test_template_rejects_non_f32_resolution():
+    resolution = moteus.PositionResolution()
+    resolution.velocity = moteus.INT16
+    with pytest.raises(ValueError):
+        PositionCommandTemplate(_controller(position_resolution=resolution), fields=('position', 'velocity'))
+
+
+def test_motor_templates_send_torque_only_if_enabled():
+    controller = _controller()
+    without = MotorCommandTemplates(controller, moteus.QueryResolution(), 1.0)
+    with_torque = MotorCommandTemplates(controller, moteus.QueryResolution(), 1.0, feedforward_torque=True)
+    assert len(with_torque.position[0].set(0.1, 0.2, 0.3).data) > len(without.position[0].set(0.1, 0.2).data)
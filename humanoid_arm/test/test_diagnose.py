@@ -0,0 +1,30 @@
+import csv
+import os
+import signal
+import threading
+from humanoid_arm import diagnose
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'config', 'arm_mapping.yaml')
+
+
+def _buses(path):
+    with open(path) as fp:
+        return [row['bus'] for row in csv.DictReader(fp)]
+
+
+def test_interrupt_still_writes_the_report(tmp_path):
+    log, summary = str(tmp_path / 'rtt.bin'), str(tmp_path / 'rtt.csv')
+    timer = threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGINT))
+    timer.start()
+    try:
+        diagnose.main(['--config', CONFIG, '--simulated', '--buses', 'right', '--rate', '200', '--log', log, '--csv', summary])
+    finally:
+        timer.cancel()
+    assert _buses(summary) == ['right', 'cycle']
+
+
+def test_read_labels_the_filtered_buses(tmp_path):
+    log, summary = str(tmp_path / 'rtt.bin'), str(tmp_path / 'rtt.csv')
+    diagnose.main(['--config', CONFIG, '--simulated', '--buses', 'right', '--cycles', '10', '--log', log])
+    diagnose.main(['--config', CONFIG, '--buses', 'right', '--read', log, '--csv', summary])
+    assert _buses(summary) == ['right', 'cycle']
@@ -0,0 +1,24 @@
+import asyncio
+import time
+from humanoid_arm.enumerate_motor import probe
+from humanoid_arm.scheduler import AdaptiveTimeout
+from humanoid_arm.simulated_transport import SimulatedTransport
+
+
+def test_probe_finds_the_present_ids():
+    transport = SimulatedTransport(ids=[3, 14, 20], latency=0.002, jitter=0.0)
+    assert asyncio.run(probe(transport, list(range(1, 128)), AdaptiveTimeout(0.02, 0.005, 0.02))) == [3, 14, 20]
+
+
+def test_absent_ids_cost_one_deadline():
+    transport = SimulatedTransport(ids=[], latency=0.002, jitter=0.0)
+    st = time.monotonic()
+    assert asyncio.run(probe(transport, list(range(1, 128)), AdaptiveTimeout(0.05, 0.005, 0.05))) == []
+    assert time.monotonic() - st < 0.2
+
+
+def test_probe_measures_the_round_trip():
+    transport = SimulatedTransport(ids=[1, 2], latency=0.004, jitter=0.0)
+    timeout = AdaptiveTimeout(0.1, 0.001, 0.1)
+    asyncio.run(probe(transport, [1, 2], timeout))
+    assert 0.003 < timeout.round_trip < 0.02
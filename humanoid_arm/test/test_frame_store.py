@@ -0,0 +1,119 @@
+import json
+import os
+import numpy as np
+from humanoid_arm.frame_store import FrameStore
+
+
+def _write_frame(directory, name: str, frame: dict, mtime: float) -> None:
+    path = os.path.join(directory, f'{name}.json')
+    with open(path, 'w') as fp:
+        json.dump({str(k): v for k, v in frame.items()}, fp)
+    os.utime(path, (mtime, mtime))
+
+
+def test_save_and_versions(tmp_path):
+    store = FrameStore(str(tmp_path / 'frames.db'), [14, 15])
+    store.save('home', [0.0, 1.0])
+    store.save('home', [0.5, 1.5])
+    np.testing.assert_allclose(store.get('home'), [0.5, 1.5])
+    assert [v for v, _ in store.history('home')] == [1, 2]
+    np.testing.assert_allclose(store.get('home', 1), [0.0, 1.0])
+    assert 'home' in store and 'wave' not in store
+    store.close()
+
+
+def test_missing_motor_is_not_playable(tmp_path):
+    store = FrameStore(str(tmp_path / 'frames.db'), [14, 15])
+    store.save_many({'left': [0.1]}, motor_id=[14])
+    assert store.names() == ['left']
+    assert store.get('left') is None and 'left' not in store
+    store.close()
+
+
+def test_refresh_sees_other_connections(tmp_path):
+    path = str(tmp_path / 'frames.db')
+    reader = FrameStore(path, [14, 15])
+    writer = FrameStore(path, [14, 15])
+    assert not reader.refresh()
+    writer.save('wave', [0.2, 0.3])
+    assert reader.refresh()
+    np.testing.assert_allclose(reader.get('wave'), [0.2, 0.3])
+    reader.close()
+    writer.close()
+
+
+def test_motion_roundtrip(tmp_path):
+    path = str(tmp_path / 'frames.db')
+    store = FrameStore(path, [14, 15])
+    waypoints = np.arange(6, dtype=float).reshape(2, 3)
+    store.save_motion('wave', waypoints, [0.5, 0.7])
+    store.close()
+    store = FrameStore(path, [15, 14])
+    waypoints_read, durations = store.get_motion('wave')
+    np.testing.assert_allclose(waypoints_read, waypoints[::-1])
+    np.testing.assert_allclose(durations, [0.5, 0.7])
+    assert store.motion_names() == ['wave']
+    store.close()
+
+
+def test_import_only_new_and_edited_json(tmp_path):
+    directory = tmp_path / 'json'
+    directory.mkdir()
+    _write_frame(directory, 'home', {14: 0.0, 15: 0.0}, 1000.0)
+    store = FrameStore(str(tmp_path / 'frames.db'), [14, 15])
+    assert store.import_json(str(directory), newer_only=True) == 1
+    assert store.import_json(str(directory), newer_only=True) == 0
+
+    # A new file and an edited file are imported, a touched but equal file is not
+    _write_frame(directory, 'wave', {14: 0.4, 15: 0.5}, 1000.0)
+    _write_frame(directory, 'home', {14: 0.0, 15: 0.0}, 4e9)
+    assert store.import_json(str(directory), newer_only=True) == 1
+    _write_frame(directory, 'home', {14: 0.1, 15: 0.0}, 4e9)
+    assert store.import_json(str(directory), newer_only=True) == 1
+    np.testing.assert_allclose(store.get('home'), [0.1, 0.0])
+    assert len(store.history('home')) == 2
+
+    # Without newer_only every file is saved again
+    assert store.import_json(str(directory)) == 2
+    store.close()
+
+
+def test_calibration_is_not_a_frame(tmp_path):
+    store = FrameStore(str(tmp_path / 'frames.db'), [14, 15])
+    assert store.get_calibration() is None
+    store.save_calibration([0.1, np.nan], [0.3, 0.4])
+    assert store.get_calibration() is None
+    store.save_calibration([0.1, 0.2], [0.3, 0.4])
+    offset, abs_position = store.get_calibration()
+    np.testing.assert_allclose(offset, [0.1, 0.2])
+    np.testing.assert_allclose(abs_position, [0.3, 0.4])
+    assert store.names() == [] and 'calibration' not in store
+    store.close()
+
+
+def test_calibration_without_absolute_position_keeps_the_offsets(tmp_path):
+    store = FrameStore(str(tmp_path / 'frames.db'), [14, 15])
+    store.save_calibration([0.1, 0.2], [np.nan, np.nan])
+    offset, abs_position = store.get_calibration()
+    np.testing.assert_allclose(offset, [0.1, 0.2])
+    assert np.isnan(abs_position).all()
+    store.close()
+
+
+def test_legacy_calibration_json_is_imported_as_calibration(tmp_path):
+    directory = tmp_path / 'json'
+    directory.mkdir()
+    _write_frame(directory, 'calibration', {14: 1.5, 15: -0.5}, 1000.0)
+    _write_frame(directory, 'home', {14: 0.0, 15: 0.0}, 1000.0)
+    store = FrameStore(str(tmp_path / 'frames.db'), [14, 15])
+    assert store.import_json(str(directory), newer_only=True) == 2
+    assert store.names() == ['home']
+    offset, abs_position = store.get_calibration()
+    np.testing.assert_allclose(offset, [1.5, -0.5])
+    assert np.isnan(abs_position).all()
+
+    # A later calibration is not replaced by the legacy offsets on the next start
+    store.save_calibration([0.1, 0.2], [0.3, 0.4])
+    assert store.import_json(str(directory), newer_only=True) == 0
+    np.testing.assert_allclose(store.get_calibration()[0], [0.1, 0.2])
+    store.close()
@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+from humanoid_arm.joint_trajectory_planner import BandedSystem, FifthOrderTrajectory, MINCOTrajectory, _least_squares_waypoints
+
+
+def _derivative_row(t: float, k: int) -> np.ndarray:
+    """Row of the k-th derivative of sum(c_j t^j), j = 0 .. 5."""
+    row = np.zeros(6)
+    for j in range(k, 6):
+        row[j] = np.prod(np.arange(j - k + 1, j + 1)) * t ** (j - k)
+    return row
+
+
+def _dense_minco(X, T, v0, a0):
+    """Minimum jerk coefficients from a dense solve of the boundary, waypoint and continuity conditions."""
+    m, n = X.shape[0], len(T)
+    A = np.zeros((6 * n, 6 * n))
+    b = np.zeros((6 * n, m))
+    rows = 0
+
+    def add(coefficients, rhs):
+        nonlocal rows
+        for i, row in coefficients:
+            A[rows, 6 * i:6 * i + 6] += row
+        b[rows] = rhs
+        rows += 1
+
+    for k, rhs in enumerate((X[:, 0], v0, a0)):
+        add([(0, _derivative_row(0.0, k))], rhs)
+    for i in range(n - 1):
+        add([(i, _derivative_row(T[i], 0))], X[:, i + 1])
+        for k in range(5):
+            add([(i, _derivative_row(T[i], k)), (i + 1, -_derivative_row(0.0, k))], 0.0)
+    for k, rhs in enumerate((X[:, n], 0.0, 0.0)):
+        add([(n - 1, _derivative_row(T[n - 1], k))], rhs)
+    return np.linalg.solve(A, b).reshape(n, 6, m)
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 7, 20])
+@pytest.mark.parametrize('initial', ['rest', 'moving'])
+def test_minco_matches_dense_solve(n, initial):
+    rng = np.random.default_rng(n)
+    m = 4
+    X = rng.uniform(-2.0, 2.0, (m, n + 1))
+    T = rng.uniform(0.2, 2.0, n)
+    v0 = np.zeros(m) if initial == 'rest' else rng.uniform(-1.0, 1.0, m)
+    a0 = np.zeros(m) if initial == 'rest' else rng.uniform(-3.0, 3.0, m)
+
+    coefficients = MINCOTrajectory.calculate(X, T, v0, a0)
+    np.testing.assert_allclose(coefficients, _dense_minco(X, T, v0, a0), rtol=1e-8, atol=1e-8)
+
+
+def test_minco_passes_waypoints():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(-1.0, 1.0, (3, 6))
+    T = rng.uniform(0.3, 1.5, 5)
+    v0 = rng.uniform(-1.0, 1.0, 3)
+    traj = MINCOTrajectory(X, T, v0)
+    states = traj.plan_many(np.concatenate(([0.0], np.cumsum(T))))
+    np.testing.assert_allclose(states[:, 0].T, X, atol=1e-9)
+    np.testing.assert_allclose(states[0, 1], v0, atol=1e-9)
+    np.testing.assert_allclose(states[-1, 1:], 0.0, atol=1e-9)
+
+
+def test_plan_evaluates_the_coefficients():
+    rng = np.random.default_rng(1)
+    traj = MINCOTrajectory(rng.uniform(-1.0, 1.0, (3, 5)), rng.uniform(0.3, 1.5, 4), rng.uniform(-1.0, 1.0, 3))
+    out = np.zeros((3, 3))
+    for t in rng.uniform(0.0, traj.duration, 20):
+        i = min(np.searchsorted(np.cumsum(traj.T), t, side='right'), len(traj.T) - 1)
+        tp = t - np.concatenate(([0.0], np.cumsum(traj.T)))[i]
+        expected = np.vstack([_derivative_row(tp, k) for k in range(3)]) @ traj.coefficients[i]
+        assert traj.plan(t, out=out) is out
+        np.testing.assert_allclose(out, expected, atol=1e-9)
+
+
+def test_plan_many_matches_plan():
+    rng = np.random.default_rng(2)
+    minco = MINCOTrajectory(rng.uniform(-1.0, 1.0, (3, 6)), rng.uniform(0.3, 1.5, 5), rng.uniform(-1.0, 1.0, 3))
+    fifth = FifthOrderTrajectory(rng.uniform(-1.0, 1.0, (3, 3)), rng.uniform(-1.0, 1.0, (3, 3)), 1.7)
+    for traj in (minco, fifth):
+        ts = np.concatenate(([0.0, traj.duration], rng.uniform(0.0, traj.duration, 50)))
+        np.testing.assert_allclose(traj.plan_many(ts), np.stack([traj.plan(t) for t in ts]), atol=1e-12)
+
+
+def test_fifth_order_meets_the_boundary_states():
+    rng = np.random.default_rng(4)
+    st, ed = rng.uniform(-1.0, 1.0, (3, 4)), rng.uniform(-1.0, 1.0, (3, 4))
+    traj = FifthOrderTrajectory(st, ed, 0.8)
+    np.testing.assert_allclose(traj.plan_many([0.0, 0.8]), np.stack([st, ed]), atol=1e-9)
+
+
+def test_anchored_starts_at_the_given_state():
+    rng = np.random.default_rng(7)
+    traj = MINCOTrajectory(rng.uniform(-1.0, 1.0, (3, 5)), rng.uniform(0.5, 1.5, 4), rng.uniform(-1.0, 1.0, 3))
+    start = traj.plan(0.0) + rng.uniform(-0.005, 0.005, (3, 3))
+    anchored = traj.anchored(start)
+    np.testing.assert_allclose(anchored.plan(0.0), start, atol=1e-9)
+    ts = np.linspace(traj.T[0], traj.duration, 50)
+    np.testing.assert_allclose(anchored.plan_many(ts), traj.plan_many(ts), atol=1e-9)
+    # The correction stays about as small as the start difference
+    ts = np.linspace(0.0, traj.T[0], 50)
+    assert np.abs(anchored.plan_many(ts)[:, 0] - traj.plan_many(ts)[:, 0]).max() <= 0.01
+    assert not np.allclose(traj.plan(0.0), start)
+
+
+@pytest.mark.parametrize('n,p,q', [(5, 1, 1), (12, 2, 3), (30, 6, 6)])
+def test_banded_system_matches_dense_solve(n, p, q):
+    rng = np.random.default_rng(n)
+    dense = np.zeros((n, n))
+    system = BandedSystem(n, p, q)
+    for i in range(n):
+        for j in range(max(0, i - p), min(n, i + q + 1)):
+            dense[i, j] = system[i, j] = rng.uniform(-1.0, 1.0)
+        # Diagonally dominant, LU without pivoting is stable
+        dense[i, i] = system[i, i] = p + q + 2.0
+    b = rng.uniform(-1.0, 1.0, (n, 3))
+
+    system.factorize()
+    np.testing.assert_allclose(system.solve(b.copy()), np.linalg.solve(dense, b), rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize('moving', [False, True])
+def test_time_optimal_respects_limits(moving):
+    rng = np.random.default_rng(3)
+    X = rng.uniform(-2.0, 2.0, (6, 8))
+    v0 = rng.uniform(-2.5, 2.5, 6) if moving else None
+    traj = MINCOTrajectory.time_optimal(X, 3.0, 10.0, v0=v0)
+    states = traj.plan_many(np.linspace(0.0, traj.duration, 20000))
+    assert np.abs(states[:, 1]).max() <= 3.0
+    assert np.abs(states[:, 2]).max() <= 10.0
+
+    # Scaling the durations uniformly touches the velocity or acceleration limit without exceeding it
+    T = rng.uniform(0.1, 2.0, 7)
+    uniform = MINCOTrajectory._scale_to_limits(X, T, v0, None, np.full(6, 3.0), np.full(6, 10.0), 0.05, 20, 256)
+    np.testing.assert_allclose(uniform.T / uniform.duration, T / T.sum())
+    ratio = uniform.limit_ratio(np.full(6, 3.0), np.full(6, 10.0), 256).max()
+    assert 0.99 <= ratio <= 1.0
+
+
+def test_least_squares_waypoints_match_dense_basis():
+    rng = np.random.default_rng(5)
+    ts = np.linspace(0.0, 4.0, 801)
+    positions = np.vstack([np.sin(ts * f) for f in (0.7, 1.9, 3.1)]) + rng.normal(0.0, 0.01, (3, len(ts)))
+    knots = np.concatenate(([0.0], np.sort(rng.uniform(0.2, 3.8, 9)), [4.0]))
+    basis = MINCOTrajectory(np.eye(len(knots)), np.diff(knots)).plan_many(ts)[:, 0]
+    expected = np.linalg.lstsq(basis, positions.T, rcond=None)[0].T
+    np.testing.assert_allclose(_least_squares_waypoints(ts, positions, knots), expected, atol=1e-8)
+
+
+def test_fit_recovers_a_minco_trajectory():
+    rng = np.random.default_rng(6)
+    reference = MINCOTrajectory(rng.uniform(-1.0, 1.0, (4, 8)), rng.uniform(0.5, 1.5, 7))
+    ts = np.linspace(0.0, reference.duration, int(reference.duration / 0.005) + 1)
+    traj = MINCOTrajectory.fit(ts + 10.0, reference.plan_many(ts)[:, 0].T, 0.005)
+    assert traj.max_error <= 0.005
+    assert len(traj.T) < 40
+    np.testing.assert_allclose(traj.plan_many(ts)[:, 0], reference.plan_many(ts)[:, 0], atol=0.005)
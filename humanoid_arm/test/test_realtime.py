@@ -0,0 +1,83 @@
+import logging
+import queue
+import time
+import numpy as np
+from humanoid_arm.arm_controller import ControllerOptions, MotorArrayDataClass
+from humanoid_arm.joint_trajectory_planner import FifthOrderTrajectory
+from humanoid_arm.realtime import ProcessLogger, RealtimeArmController, RealtimeOptions, RemoteTrajectoryExecutor, SharedArmState
+from humanoid_arm.topology import parse_topology
+
+
+def _topology():
+    return parse_topology({
+        'buses.left.transport': 'simulated',
+        'buses.right.transport': 'simulated',
+        'motors.motor_14.bus': 'left',
+        'motors.motor_15.bus': 'left',
+        'motors.motor_19.bus': 'right',
+        'motors.motor_20.bus': 'right',
+    })
+
+
+def _trajectory(target: float, duration: float = 0.3, n: int = 4) -> FifthOrderTrajectory:
+    return FifthOrderTrajectory(np.zeros((3, n)), np.vstack([np.full(n, target), np.zeros((2, n))]), duration)
+
+
+def test_shared_state_is_seen_by_both_sides():
+    motors = MotorArrayDataClass.from_topology(_topology())
+    motors.offset[:] = [0.1, 0.2, 0.3, 0.4]
+    owner = SharedArmState(len(motors))
+    owner.attach(motors)
+    other = MotorArrayDataClass.from_topology(_topology())
+    shared = SharedArmState(len(other), owner.shm.name)
+    shared.attach(other)
+    try:
+        np.testing.assert_allclose(other.offset, [0.1, 0.2, 0.3, 0.4])
+        assert np.isnan(other.temperature).all() and shared.flags[0]
+        other.feedback[0] = [1.0, 2.0, 3.0, 4.0]
+        np.testing.assert_allclose(motors.feedback[0], [1.0, 2.0, 3.0, 4.0])
+    finally:
+        shared.close()
+        owner.close()
+
+
+def test_process_logger_throttles_messages_with_the_same_beginning(caplog):
+    logger = ProcessLogger('test_realtime')
+    with caplog.at_level(logging.WARNING, logger='test_realtime'):
+        for i in range(5):
+            logger.warning(f'Bus left timeout {i} times.', throttle_duration_sec=10.0)
+        logger.warning('Bus right timeout 1 times.', throttle_duration_sec=10.0)
+    assert [r.message for r in caplog.records] == ['Bus left timeout 0 times.', 'Bus right timeout 1 times.']
+
+
+def test_remote_goal_is_finished_by_the_process_event():
+    commands = queue.Queue()
+    executor = RemoteTrajectoryExecutor(commands)
+    goal = executor.submit(_trajectory(1.0), 10.0)
+    assert commands.get_nowait()[:2] == ('submit', 0)
+    assert executor.state(10.3) is not None
+    assert executor.cancel(goal, _trajectory(0.0, 0.1), 10.1)
+    assert goal.done() and not goal.succeeded
+    assert commands.get_nowait()[:2] == ('cancel', 0)
+    # The braking trajectory finishes as goal -1
+    executor._finish(-1, True)
+    assert executor.state(10.15) is None
+
+
+def test_trajectory_runs_in_the_control_process():
+    controller = RealtimeArmController(_topology(), ControllerOptions(), RealtimeOptions(priority=0, lock_memory=False), ProcessLogger('test'))
+    try:
+        deadline = time.monotonic() + 10.0
+        while not controller.motors.initialized.all() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert controller.alive() and controller.motors.initialized.all()
+        # The arm starts in teach mode, the flag is shared with the process
+        controller.teach_mode = False
+        goal = controller.trajectory_executor.submit(_trajectory(0.5), time.monotonic())
+        assert goal.wait(5.0) and goal.succeeded
+        time.sleep(0.3)
+        np.testing.assert_allclose(controller.motors.feedback[0], 0.5, atol=0.05)
+        assert all(h.cycles > 0 for h in controller.bus_health)
+    finally:
+        controller.stop()
+    assert not controller.alive()
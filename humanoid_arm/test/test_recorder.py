@@ -0,0 +1,51 @@
+import asyncio
+import time
+import numpy as np
+from humanoid_arm.joint_trajectory_planner import FifthOrderTrajectory, MINCOTrajectory
+from humanoid_arm.recorder import Recorder, load_recording, save_recording
+from test_arm_controller import _controller
+
+
+def test_recorder_drops_samples_beyond_capacity():
+    recorder = Recorder(2, 3)
+    for i in range(5):
+        recorder.add(float(i), np.full((3, 2), i))
+    t, feedback = recorder.take()
+    np.testing.assert_allclose(t, [0.0, 1.0, 2.0])
+    assert feedback.shape == (3, 3, 2) and recorder.dropped == 2
+    feedback[0] = -1.0
+    assert recorder.feedback[0, 0, 0] == 0.0
+
+
+def test_recording_roundtrip(tmp_path):
+    path = str(tmp_path / 'wave.npz')
+    t = 100.0 + np.arange(4) * 0.01
+    feedback = np.random.default_rng(0).normal(size=(4, 3, 2))
+    save_recording(path, [14, 15], t, feedback)
+    motor_id, t_read, feedback_read = load_recording(path)
+    assert motor_id.tolist() == [14, 15]
+    np.testing.assert_allclose(t_read, t - 100.0)
+    np.testing.assert_allclose(feedback_read, feedback, rtol=1e-6)
+
+
+def test_control_loop_records_feedback_for_fitting():
+    done = []
+    controller = _controller(done)
+    controller.teach_mode = False
+    move = FifthOrderTrajectory(np.zeros((3, 4)), np.vstack([np.full(4, 0.3), np.zeros((2, 4))]), 0.4)
+
+    async def scenario():
+        await asyncio.sleep(0.1)
+        controller.start_recording(1000)
+        controller.trajectory_executor.submit(move, time.monotonic())
+        await asyncio.sleep(0.6)
+        done.append(controller.stop_recording())
+
+    asyncio.run(controller.run(scenario()))
+    t, feedback = done[0]
+    assert len(t) > 20 and feedback.shape[1:] == (3, 4)
+    assert np.all(np.diff(t) > 0)
+    np.testing.assert_allclose(feedback[-1, 0], 0.3, atol=0.01)
+    # Samples are stamped when the reply arrives, a stalled loop shifts them by a few ms
+    traj = MINCOTrajectory.fit(t, feedback[:, 0].T, tolerance=0.05)
+    assert traj.max_error <= 0.05
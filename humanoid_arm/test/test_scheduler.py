@@ -0,0 +1,74 @@
+import asyncio
+import time
+import numpy as np
+from humanoid_arm.scheduler import AdaptiveTimeout, DeadlineScheduler, Histogram, TrackingError
+
+
+def test_deadline_scheduler_keeps_the_rate():
+    async def run():
+        scheduler = DeadlineScheduler(200.0)
+        st = time.monotonic()
+        for _ in range(40):
+            await scheduler.wait()
+        return time.monotonic() - st, scheduler.overruns
+
+    elapsed, overruns = asyncio.run(run())
+    assert 39 * 0.005 <= elapsed < 39 * 0.005 + 0.05
+    # A stall of the test machine costs an overrun, not a burst of cycles
+    assert overruns <= 2
+
+
+def test_deadline_scheduler_skips_missed_deadlines():
+    async def run():
+        scheduler = DeadlineScheduler(100.0)
+        await scheduler.wait()
+        time.sleep(0.035)
+        st = time.monotonic()
+        await scheduler.wait()
+        return time.monotonic() - st, scheduler.overruns
+
+    delay, overruns = asyncio.run(run())
+    # The late cycle waits for the next deadline on the grid instead of running the missed ones back to back
+    assert overruns == 1
+    assert delay < 0.011
+
+
+def test_histogram_take():
+    histogram = Histogram()
+    for ms in (0.05, 0.3, 0.3, 4.0, 300.0):
+        histogram.add(ms / 1000)
+    counts, maximum = histogram.take()
+    assert counts.sum() == 5 and counts[0] == 1 and counts[2] == 2 and counts[-1] == 1
+    assert abs(maximum - 300.0) < 1e-9
+    assert Histogram.percentile(counts, 50) == 0.5
+    assert Histogram.percentile(counts, 100) == float('inf')
+    assert histogram.take()[0].sum() == 0
+    assert len(Histogram.labels()) == len(counts)
+
+
+def test_adaptive_timeout_follows_the_round_trip():
+    timeout = AdaptiveTimeout(0.1, 0.005, 0.5)
+    assert timeout.timeout == 0.1
+    for _ in range(50):
+        timeout.update(0.002)
+    assert abs(timeout.timeout - 0.008) < 1e-6
+    timeout.update(10.0)
+    assert timeout.timeout == 0.5
+
+
+def test_tracking_error_take_and_merge():
+    tracking = TrackingError(3)
+    tracking.add(np.array([0, 2]), np.array([0.1, -0.3]))
+    tracking.add(np.array([0]), np.array([-0.2]))
+    sum_sq, count, maximum = tracking.take()
+    assert count.tolist() == [2, 0, 1]
+    np.testing.assert_allclose(maximum, [0.2, 0.0, 0.3])
+    rms = TrackingError.rms(sum_sq, count)
+    np.testing.assert_allclose(rms[[0, 2]], [np.sqrt(0.025), 0.3])
+    assert np.isnan(rms[1])
+    assert tracking.take()[1].sum() == 0
+
+    total = TrackingError(3)
+    total.merge(sum_sq, count, maximum)
+    total.merge(sum_sq, count, maximum)
+    np.testing.assert_allclose(TrackingError.rms(*total.take()[:2])[[0, 2]], rms[[0, 2]])
@@ -0,0 +1,40 @@
+import asyncio
+import moteus
+from humanoid_arm.simulated_transport import SimulatedTransport, decode_writes
+
+
+def _controllers(transport, ids):
+    return [moteus.Controller(id=i, transport=transport) for i in ids]
+
+
+def test_decode_writes_of_a_position_command():
+    command = moteus.Controller(id=1).make_position(position=0.25, velocity=-0.5, maximum_torque=2.0)
+    writes = decode_writes(command.data)
+    assert writes[0x000] == 10
+    assert writes[0x020] == 0.25 and writes[0x021] == -0.5 and writes[0x025] == 2.0
+
+
+def test_only_configured_ids_answer():
+    transport = SimulatedTransport(ids=[1, 3], latency=0.0, jitter=0.0)
+    states = asyncio.run(transport.cycle([c.make_query() for c in _controllers(transport, [1, 2, 3])]))
+    assert sorted(s.id for s in states) == [1, 3]
+
+
+def test_motor_follows_the_position_target():
+    async def run():
+        transport = SimulatedTransport(latency=0.001, jitter=0.0, time_constant=0.02, initial_position=0.1)
+        c = _controllers(transport, [1])[0]
+        start = (await transport.cycle([c.make_stop(query=True)]))[0].values[moteus.Register.POSITION]
+        for _ in range(100):
+            states = await transport.cycle([c.make_position(position=0.5, query=True)])
+        return start, states[0].values
+
+    start, values = asyncio.run(run())
+    assert abs(start - 0.1) < 1e-6
+    assert abs(values[moteus.Register.POSITION] - 0.5) < 0.01
+    assert values[moteus.Register.MODE] == 10
+
+
+def test_dropped_replies():
+    transport = SimulatedTransport(latency=0.0, jitter=0.0, drop_rate=1.0)
+    assert asyncio.run(transport.cycle([c.make_query() for c in _controllers(transport, [1, 2])])) == []
@@ -0,0 +1,56 @@
+import os
+import pytest
+import moteus
+from humanoid_arm.topology import load_topology, make_query_resolution, parse_topology
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'config', 'arm_mapping.yaml')
+
+
+def test_parse_topology_sorts_buses_and_motors():
+    topology = parse_topology({
+        'buses.right.device': '/dev/b',
+        'buses.left.device': '/dev/a',
+        'buses.left.rate': 500.0,
+        'motors.motor_20.bus': 'right',
+        'motors.motor_14.bus': 'left',
+        'motors.motor_14.reverse': True,
+        'motors.motor_15.bus': 'left',
+        'use_sim_time': False,
+    })
+    assert [b.name for b in topology.buses] == ['left', 'right']
+    assert topology.buses[0].rate == 500.0 and topology.buses[1].rate == 0.0
+    assert [m.id for m in topology.motors] == [14, 15, 20]
+    assert topology.motors[0].reverse and not topology.motors[1].reverse
+    assert [m.id for m in topology.motors_on(0)] == [14, 15]
+    assert topology.bus_of(topology.motors[2]) == 1
+
+
+def test_unknown_bus_is_rejected():
+    with pytest.raises(ValueError):
+        parse_topology({'buses.left.device': '', 'motors.motor_14.bus': 'middle'})
+
+
+def test_shipped_config_loads():
+    topology = load_topology(CONFIG)
+    assert [b.name for b in topology.buses] == ['left', 'right']
+    assert [m.id for m in topology.motors] == list(range(14, 24))
+
+
+def test_query_resolution_ignores_unused_registers():
+    qr = make_query_resolution('int16')
+    assert qr.position == qr.velocity == qr.torque == moteus.INT16
+    assert qr.mode == qr.voltage == qr.temperature == qr.fault == qr.abs_position == moteus.IGNORE
+    full = moteus.Controller(id=1).make_query()
+    reduced = moteus.Controller(id=1, query_resolution=qr).make_query()
+    assert len(reduced.data) < len(full.data)
+
+
+def test_slow_query_resolution_adds_temperature_fault_and_abs_position():
+    qr = make_query_resolution('f32', slow=True)
+    assert qr.position == moteus.F32
+    assert qr.temperature == qr.fault == moteus.INT8 and qr.abs_position == moteus.INT16
+
+
+def test_unknown_query_resolution_is_rejected():
+    with pytest.raises(ValueError):
+        make_query_resolution('int64')
@@ -0,0 +1,36 @@
+import numpy as np
+from humanoid_arm.joint_trajectory_planner import FifthOrderTrajectory
+from humanoid_arm.trajectory_executor import TrajectoryExecutor
+
+
+def _trajectory(duration: float = 1.0) -> FifthOrderTrajectory:
+    return FifthOrderTrajectory(np.zeros((3, 2)), np.vstack([np.ones(2), np.zeros((2, 2))]), duration)
+
+
+def test_goal_succeeds_at_the_end():
+    executor = TrajectoryExecutor()
+    goal = executor.submit(_trajectory(), 10.0)
+    out = np.zeros((3, 2))
+    assert executor.sample(10.5, out) and not goal.wait(0.0)
+    assert executor.sample(11.0, out)
+    assert goal.wait(0.0) and goal.succeeded
+    np.testing.assert_allclose(out[0], 1.0)
+    assert not executor.sample(11.1, out)
+
+
+def test_preempted_goal_is_done():
+    executor = TrajectoryExecutor()
+    goal = executor.submit(_trajectory(), 10.0)
+    newer = executor.submit(_trajectory(), 10.5)
+    assert goal.wait(0.0) and not goal.succeeded
+    assert goal.progress(10.5) == 0.0
+    assert not newer.wait(0.0)
+
+
+def test_cancel_continues_with_the_stop_trajectory():
+    executor = TrajectoryExecutor()
+    goal = executor.submit(_trajectory(), 10.0)
+    assert executor.cancel(goal, _trajectory(0.2), 10.5)
+    assert goal.wait(0.0) and not goal.succeeded
+    assert not executor.cancel(goal)
+    assert executor.state(10.5) is not None
@@ -21,10 +21,11 @@ def generate_launch_description():
             executable='humanoid_web_node',
             name='humanoid_web'
         ),
-        Node(
-            package='humanoid_arm',
-            executable='humanoid_arm_node',
-            name='humanoid_arm'
+        IncludeLaunchDescription(
+            AnyLaunchDescriptionSource([
+                os.path.join(get_package_share_directory('humanoid_arm'), 'launch'),
+                '/humanoid_arm.py'
+            ])
         ),
         Node(
             package='joy', executable='joy_node', name='joy_node',
@@ -14,8 +14,11 @@ class ChatDemoNode(HumanoidChatNode):
         self._fix_leg_motor()
         self._enter_teach_mode()
         
-        input("Press Enter to continue...")
-        self._calibration_arm()
+        if self._arm_calibrated():
+            self._exit_teach_mode()
+        else:
+            input("Press Enter to continue...")
+            self._calibration_arm()
         input("Press Enter to continue...")
         
         self.demo3()
@@ -59,12 +59,15 @@ class DirectorDemoNode(HumanoidChatNode):
         self._fix_leg_motor()
         self._enter_teach_mode()
 
-        self._azure.text_to_speech('开始校准手臂电机，请让双臂自然下垂，完成校准后请对我说小琳。')
-        self._azure.wait_speech_synthesising()
-        self._detect_keyword()
-        self._calibration_arm()
-        self._azure.text_to_speech('已完成校准。')
-        self._azure.wait_speech_synthesising()
+        if self._arm_calibrated():
+            self._exit_teach_mode()
+        else:
+            self._azure.text_to_speech('开始校准手臂电机，请让双臂自然下垂，完成校准后请对我说小琳。')
+            self._azure.wait_speech_synthesising()
+            self._detect_keyword()
+            self._calibration_arm()
+            self._azure.text_to_speech('已完成校准。')
+            self._azure.wait_speech_synthesising()
         self._calibrated = True
 
         while rclpy.ok():
@@ -3,8 +3,10 @@ import threading
 import rclpy
 import rclpy.qos
 from rclpy.node import Node
-from std_srvs.srv import SetBool, Empty
+from rclpy.action import ActionClient
+from std_srvs.srv import SetBool, Empty, Trigger
 from humanoid_interface.srv import Speak, PlayArmSequence
+from humanoid_interface.action import PlayArmSequence as PlayArmSequenceAction
 from humanoid_interface.msg import ChatResult, FaceControl, MotorControl, NeckControl
 from sensor_msgs.msg import Joy
 from .azure_speech import AzureSpeechService
@@ -55,9 +57,11 @@ class HumanoidChatNode(Node):
         self._speak_service = self.create_service(Speak, "speak", self._speak_callback)
         self._face_control_publisher = self.create_publisher(FaceControl, "face_control", rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
         self._play_arm_sequence_client = self.create_client(PlayArmSequence, "arm/play_sequence")
+        self._play_arm_sequence_action_client = ActionClient(self, PlayArmSequenceAction, "arm/play_sequence")
         self._motor_control_publisher = self.create_publisher(MotorControl, "motor_control", rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
         self._teach_mode_client = self.create_client(SetBool, "arm/teach_mode")
         self._calibration_client = self.create_client(Empty, "arm/calibration")
+        self._calibration_status_client = self.create_client(Trigger, "arm/calibration_status")
         self._neck_control_publisher = self.create_publisher(NeckControl, "neck_control", rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
         self._joy_subscription = self.create_subscription(Joy, "joy", self._joy_callback, rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
 
@@ -145,29 +149,44 @@ class HumanoidChatNode(Node):
             if self._azure.is_speech_synthesising():
                 self._azure.stop_speaking()
 
+    def _send_arm_sequence_goal(self, frame_name, duration):
+        goal = PlayArmSequenceAction.Goal()
+        goal.frame_name = frame_name
+        goal.duration = duration
+        self._play_arm_sequence_action_client.wait_for_server()
+        return self._play_arm_sequence_action_client.send_goal_async(goal)
+
     def _gesture_thread_callback(self):
         running_gesture = False
         current_gesture = None
+        goal_future = None
+        result_future = None
+        finish_time = None
         while rclpy.ok():
             if self._gesture_on:
                 running_gesture = True
-            else:
-                if running_gesture:
-                    running_gesture = False
-                    msg = PlayArmSequence.Request()
-                    msg.duration = [2.0]
-                    msg.frame_name = ['home']
-                    self._play_arm_sequence_client.wait_for_service()
-                    self._play_arm_sequence_client.call(msg)
-            if running_gesture:
-                msg = PlayArmSequence.Request()
-                msg.duration = [2.0]
-                while (random_gesture := random.choice(self._gesture_list)) == current_gesture:
-                    random_gesture = random.choice(self._gesture_list)
-                msg.frame_name = [random_gesture]
-                self._play_arm_sequence_client.wait_for_service()
-                self._play_arm_sequence_client.call(msg)
-            time.sleep(1.0)
+                if goal_future is not None and goal_future.done():
+                    goal_handle = goal_future.result()
+                    goal_future = None
+                    if goal_handle.accepted:
+                        result_future = goal_handle.get_result_async()
+                if result_future is not None and result_future.done():
+                    # Rest a while before the next gesture
+                    result_future = None
+                    finish_time = time.time()
+                if goal_future is None and result_future is None and (finish_time is None or time.time() - finish_time > 1.0):
+                    while (random_gesture := random.choice(self._gesture_list)) == current_gesture:
+                        random_gesture = random.choice(self._gesture_list)
+                    current_gesture = random_gesture
+                    goal_future = self._send_arm_sequence_goal([random_gesture], [2.0])
+            elif running_gesture:
+                # The new goal preempts the running gesture
+                running_gesture = False
+                self._send_arm_sequence_goal(['home'], [2.0])
+                goal_future = None
+                result_future = None
+                finish_time = None
+            time.sleep(0.1)
 
     def _test_random_gesture(self):
         self._play_arm_sequence_client.wait_for_service()
@@ -380,14 +399,25 @@ class HumanoidChatNode(Node):
         self._teach_mode_client.wait_for_service()
         self._teach_mode_client.call(msg)
 
-    def _calibration_arm(self):
-        msg = Empty.Request()
-        self._calibration_client.wait_for_service()
-        self._calibration_client.call(msg)
+    def _exit_teach_mode(self):
         msg = SetBool.Request()
         msg.data = False
         self._teach_mode_client.wait_for_service()
         self._teach_mode_client.call(msg)
+
+    def _calibration_arm(self):
+        msg = Empty.Request()
+        self._calibration_client.wait_for_service()
+        self._calibration_client.call(msg)
+        self._exit_teach_mode()
+
+    def _arm_calibrated(self, timeout=10.0):
+        # The arm node verifies its persisted calibration once all motors answered
+        self._calibration_status_client.wait_for_service()
+        st = time.time()
+        while (result := self._calibration_status_client.call(Trigger.Request())).message == 'pending' and time.time() - st < timeout:
+            time.sleep(0.5)
+        return result.success
     
     def _shake_hand(self, wait=5.0):
         self._play_arm_sequence_client.wait_for_service()
@@ -450,10 +480,13 @@ class HumanoidChatNode(Node):
         self._fix_leg_motor()
         self._enter_teach_mode()
         
-        self._azure.text_to_speech('开始校准手臂电机，请让双臂自然下垂，完成校准后请对我说小琳。')
-        self._detect_keyword()
-        self._calibration_arm()
-        self._azure.wait_speech_synthesising()
+        if self._arm_calibrated():
+            self._exit_teach_mode()
+        else:
+            self._azure.text_to_speech('开始校准手臂电机，请让双臂自然下垂，完成校准后请对我说小琳。')
+            self._detect_keyword()
+            self._calibration_arm()
+            self._azure.wait_speech_synthesising()
         
         self._azure.text_to_speech('正在测试所有预设动作。')
         self._rolling_eyes(repeat=2)
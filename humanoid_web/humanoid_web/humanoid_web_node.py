@@ -3,13 +3,15 @@ import rclpy
 import rclpy.qos
 from rclpy.node import Node
 from rclpy.time import Time
+from rclpy.action import ActionClient
 import uvicorn
 import threading
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from .api_types import *
-from humanoid_interface.msg import MotorControl, MotorControlBatch, MotorFeedback, FaceControl, NeckControl, HeadFeedback
-from humanoid_interface.srv import PlayArm, GetArmFrameList, TeachArm, GetActionList, DoAction
+from humanoid_interface.msg import MotorControl, MotorControlBatch, MotorFeedback, MotorFeedbackBatch, FaceControl, NeckControl, HeadFeedback
+from humanoid_interface.srv import GetArmFrameList, TeachArm, GetActionList, DoAction
+from humanoid_interface.action import PlayArm
 from std_srvs.srv import SetBool, Empty
 
 class HumanoidWebNode(Node):
@@ -39,6 +41,7 @@ class HumanoidWebNode(Node):
         
         # Create ros subsctiption
         self._motor_feedback_subscription = self.create_subscription(MotorFeedback, "motor_feedback", self._motor_feedback_callback, rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
+        self._motor_feedback_batch_subscription = self.create_subscription(MotorFeedbackBatch, "motor_feedback_batch", self._motor_feedback_batch_callback, rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
         self._head_feedback_subscription = self.create_subscription(HeadFeedback, "head_feedback", self._head_feedback_callback, rclpy.qos.QoSPresetProfiles.get_from_short_key("SENSOR_DATA"))
         
         # Create ros publisher
@@ -48,7 +51,8 @@ class HumanoidWebNode(Node):
         self._motor_control_batch_publisher = self.create_publisher(MotorControlBatch, "motor_control_batch", rclpy.qos.QoSPresetProfiles.get_from_short_key("SYSTEM_DEFAULT"))
         
         # Create ros service client
-        self._play_arm_client = self.create_client(PlayArm, "arm/play")
+        self._play_arm_action_client = ActionClient(self, PlayArm, "arm/play")
+        self._play_arm_goal_handle = None
         self._get_frame_list_client = self.create_client(GetArmFrameList, "arm/get_frame_list")
         self._teach_mode_client = self.create_client(SetBool, "arm/teach_mode")
         self._calibration_client = self.create_client(Empty, "arm/calibration")
@@ -58,6 +62,16 @@ class HumanoidWebNode(Node):
     
     def _motor_feedback_callback(self, msg: MotorFeedback) -> None:
         self.motor_feedback[msg.id] = msg
+
+    def _motor_feedback_batch_callback(self, msg: MotorFeedbackBatch) -> None:
+        for i in range(len(msg.id)):
+            self.motor_feedback[msg.id[i]] = MotorFeedback(
+                stamp=msg.stamp,
+                id=msg.id[i],
+                position=msg.position[i],
+                velocity=msg.velocity[i],
+                torque=msg.torque[i]
+            )
     
     def _head_feedback_callback(self, msg: HeadFeedback) -> None:
         self.head_feedback = msg
@@ -98,13 +112,26 @@ class HumanoidWebNode(Node):
         self._neck_control_publisher.publish(msg)
     
     def play_arm(self, frame_name: str, duration: float) -> bool:
-        request = PlayArm.Request()
-        request.frame_name = frame_name
-        request.duration = duration
-        if not self._play_arm_client.wait_for_service(timeout_sec=1.0):
+        goal = PlayArm.Goal()
+        goal.frame_name = frame_name
+        goal.duration = duration
+        if not self._play_arm_action_client.wait_for_server(timeout_sec=1.0):
             return False
-        response = self._play_arm_client.call(request)
-        return response.result
+        # Only wait until the goal is accepted, the motion runs in the arm node
+        accepted = threading.Event()
+        future = self._play_arm_action_client.send_goal_async(goal)
+        future.add_done_callback(lambda _: accepted.set())
+        if not accepted.wait(timeout=1.0):
+            return False
+        self._play_arm_goal_handle = future.result()
+        return self._play_arm_goal_handle.accepted
+
+    def stop_arm(self) -> bool:
+        if self._play_arm_goal_handle is None:
+            return False
+        self._play_arm_goal_handle.cancel_goal_async()
+        self._play_arm_goal_handle = None
+        return True
     
     def get_arm_frame_list(self) -> List[str]:
         request = GetArmFrameList.Request()
@@ -249,6 +276,15 @@ def arm_play_to_frame(command: ApiPlayArmRequest):
         raise HTTPException(status_code=404, detail="Frame not found")
 
 
+@app.put("/arm/stop")
+def arm_stop():
+    result = humanoid_web_node.stop_arm()
+    if result:
+        return {"message": "Success"}
+    else:
+        raise HTTPException(status_code=404, detail="No arm motion to stop")
+
+
 @app.get("/arm/frames")
 def get_arm_frames() -> ApiGetArmFramesResponse:
     response = ApiGetArmFramesResponse(frames=humanoid_web_node.get_arm_frame_list())